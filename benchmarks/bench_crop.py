@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+دقة وسرعة كشف شريط الحالة وشريط التنقل في crop_phone_frame (بوت العروض)
+
+مجموعة دقة مولّدة: لقطات شاشة بدقات جوالات شائعة، شريط حالة بأيقونات وساعة،
+شريط تنقل (بدون / إيماءة / أزرار)، ومحتوى متنوع (صور، قوائم فاتحة، وضع ليلي).
+الحد الصحيح معروف لكل صورة - نقارن الكاشف مع القص الثابت (5%).
+
+الاستخدام:
+    python benchmarks/bench_crop.py
+    python benchmarks/bench_crop.py --count 500 --seed 7
+    python benchmarks/bench_crop.py --images shots/ --labels shots/labels.json   # {"a.png": [top, bottom]}
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+import cv2
+import numpy as np
+
+BOT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "telegram-offers-bot")
+sys.path.insert(0, BOT_DIR)
+
+from handlers import media_tools  # noqa: E402
+
+RESOLUTIONS = [(720, 1600), (1080, 2340), (1170, 2532), (1440, 3200), (828, 1792)]
+CONTENT_KINDS = ["photo", "light_list", "dark_list", "header"]
+NAV_KINDS = ["none", "gesture", "buttons"]
+
+
+def draw_icons(img, y0, y1, color, rng):
+    """ساعة يسار وأيقونات يمين داخل الشريط"""
+    width = img.shape[1]
+    h = y1 - y0
+    cv2.putText(img, f"{rng.randint(1, 12)}:{rng.randint(10, 59)}", (int(width * 0.05), y0 + int(h * 0.7)),
+                cv2.FONT_HERSHEY_SIMPLEX, h / 45, color, max(1, h // 25))
+    x = int(width * 0.75)
+    for _ in range(3):
+        w = int(width * rng.uniform(0.03, 0.05))
+        cv2.rectangle(img, (x, y0 + h // 3), (x + w, y1 - h // 3), color, -1)
+        x += w + int(width * 0.015)
+
+
+def draw_content(img, y0, y1, kind, rng):
+    # الرسم داخل view لمنطقة المحتوى فقط - لا شيء يتسرب إلى الشريطين
+    region = img[y0:y1]
+    height, width = region.shape[:2]
+    if kind == "photo":
+        noise = rng_array(rng, (height // 16 + 1, width // 16 + 1, 3))
+        region[:] = cv2.resize(cv2.GaussianBlur(noise, (3, 3), 0), (width, height), interpolation=cv2.INTER_CUBIC)
+        return
+    bg, fg = ((250, 250, 250), (30, 30, 30)) if kind != "dark_list" else ((18, 18, 18), (220, 220, 220))
+    region[:] = bg
+    y = 0
+    if kind == "header":
+        # شريط عنوان التطبيق بلون مختلف عن شريط الحالة
+        color = tuple(int(c) for c in rng_array(rng, (3,)))
+        cv2.rectangle(region, (0, 0), (width, 150), color, -1)
+        y += 150
+    # القائمة حتى حافة المحتوى - فراغ كبير بلون واحد أسفلها لا يتميز عن شريط تنقل
+    while y < height:
+        cv2.circle(region, (80, y + 60), 40, (rng.randint(0, 255), rng.randint(0, 255), rng.randint(0, 255)), -1)
+        cv2.putText(region, "list item title", (150, y + 55), cv2.FONT_HERSHEY_SIMPLEX, 1.2, fg, 2)
+        cv2.putText(region, "secondary line of text", (150, y + 95), cv2.FONT_HERSHEY_SIMPLEX, 0.9, fg, 1)
+        y += 140
+
+
+def rng_array(rng, shape):
+    return np.random.default_rng(rng.randint(0, 2**31)).integers(0, 256, shape, dtype=np.uint8)
+
+
+def make_screenshot(rng):
+    """(الصورة، أعلى، أسفل) - حدود المحتوى الحقيقية"""
+    width, height = rng.choice(RESOLUTIONS)
+    img = np.zeros((height, width, 3), np.uint8)
+    content = rng.choice(CONTENT_KINDS)
+    nav = rng.choice(NAV_KINDS)
+
+    top = int(height * rng.uniform(0.025, 0.055))
+    status_bg = (0, 0, 0) if content in ("photo", "dark_list") or rng.random() < 0.3 else (rng.randint(60, 200),) * 3
+    img[:top] = status_bg
+    draw_icons(img, 0, top, (255, 255, 255) if sum(status_bg) < 300 else (0, 0, 0), rng)
+
+    if nav == "none":
+        bottom = height
+    else:
+        bottom = height - int(height * (rng.uniform(0.015, 0.025) if nav == "gesture" else rng.uniform(0.045, 0.06)))
+        nav_bg = (0, 0, 0) if rng.random() < 0.6 else (rng.randint(200, 245),) * 3
+        img[bottom:] = nav_bg
+        fg = (255, 255, 255) if sum(nav_bg) < 300 else (60, 60, 60)
+        h = height - bottom
+        if nav == "gesture":
+            cv2.rectangle(img, (width // 2 - width // 6, bottom + h // 2 - 4), (width // 2 + width // 6, bottom + h // 2 + 4), fg, -1)
+        else:
+            for cx in (width // 4, width // 2, 3 * width // 4):
+                cv2.circle(img, (cx, bottom + h // 2), h // 4, fg, 3)
+
+    draw_content(img, top, bottom, content, rng)
+    return img, top, bottom, f"{content}/{nav}"
+
+
+def load_labeled(directory, labels_path):
+    with open(labels_path) as f:
+        labels = json.load(f)
+    for name, (top, bottom) in labels.items():
+        img = cv2.imread(os.path.join(directory, name), cv2.IMREAD_COLOR)
+        if img is not None:
+            yield img, top, bottom, name
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--images", help="directory of real screenshots")
+    parser.add_argument("--labels", help="JSON {file: [top, bottom]} for --images")
+    parser.add_argument("--verbose", action="store_true", help="print every miss")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    if args.images:
+        samples = list(load_labeled(args.images, args.labels))
+    else:
+        samples = [make_screenshot(rng) for _ in range(args.count)]
+
+    stats = {"detector": [0, 0], "fixed_5%": [0, 0]}
+    errors = {"detector": [], "fixed_5%": []}
+    by_kind = {}
+    detect_ms = []
+    for img, top, bottom, kind in samples:
+        height = img.shape[0]
+        # خطأ مقبول: 0.3% من الارتفاع (أقل من نصف شريط الحالة بكثير)
+        tolerance = max(4, int(height * 0.003))
+
+        start = time.perf_counter()
+        cropped = media_tools._crop_op(img)
+        detect_ms.append((time.perf_counter() - start) * 1000)
+        # حدود القص من المصفوفة الناتجة (view من الأصل)
+        pred_top = (cropped.__array_interface__["data"][0] - img.__array_interface__["data"][0]) // img.strides[0]
+        pred_bottom = pred_top + cropped.shape[0]
+        fixed_top, fixed_bottom = int(height * 0.05), int(height * 0.95)
+
+        for name, (t, b) in (("detector", (pred_top, pred_bottom)), ("fixed_5%", (fixed_top, fixed_bottom))):
+            ok_top, ok_bottom = abs(t - top) <= tolerance, abs(b - bottom) <= tolerance
+            stats[name][0] += ok_top
+            stats[name][1] += ok_bottom
+            errors[name].append((abs(t - top) + abs(b - bottom)) / 2)
+            if name == "detector":
+                hits = by_kind.setdefault(kind, [0, 0])
+                hits[0] += ok_top and ok_bottom
+                hits[1] += 1
+                if args.verbose and not (ok_top and ok_bottom):
+                    print(f"  miss {kind} {img.shape[1]}x{height}: top {t} vs {top}, bottom {b} vs {bottom}")
+
+    n = len(samples)
+    print(f"\n{n} screenshots")
+    print(f"{'method':<12}{'top ok':>10}{'bottom ok':>12}{'mean err px':>14}")
+    for name, (ok_top, ok_bottom) in stats.items():
+        print(f"{name:<12}{ok_top / n:>10.1%}{ok_bottom / n:>12.1%}{np.mean(errors[name]):>14.1f}")
+
+    print(f"\n{'kind (detector)':<24}{'both ok':>10}")
+    for kind, (ok, total) in sorted(by_kind.items()):
+        print(f"{kind:<24}{ok / total:>10.1%}")
+
+    detect_ms.sort()
+    print(f"\nDetection + crop: p50 {detect_ms[n // 2]:.2f} ms, p99 {detect_ms[min(n - 1, int(n * 0.99))]:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
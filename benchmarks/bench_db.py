@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+قياس أداء استعلامات قاعدة البيانات قبل وبعد الترحيلات (الفهارس و epoch)
+
+الاستخدام:
+    python benchmarks/bench_db.py            # مليون صف لكل جدول
+    python benchmarks/bench_db.py --rows 100000
+"""
+
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database  # noqa: E402
+
+PLATFORMS = ["tiktok", "instagram", "youtube", "twitter", "snapchat", "pinterest", "facebook"]
+
+# الاستعلامات كما كانت قبل الترحيلات
+LEGACY_QUERIES = {
+    "get_unsent_offers": [("SELECT * FROM offers WHERE is_sent = 0 LIMIT 10", ())],
+    "get_stats": [
+        ("SELECT COUNT(*) FROM offers", ()),
+        ("SELECT COUNT(*) FROM offers WHERE is_sent = 1", ()),
+    ],
+    "get_download_stats": [
+        ("SELECT COUNT(*) FROM download_stats WHERE success = 1", ()),
+        ("SELECT COUNT(*) FROM download_stats WHERE success = 0", ()),
+    ],
+    "get_user_stats": [
+        ("SELECT COUNT(*) FROM users", ()),
+        ("SELECT COUNT(*) FROM users WHERE last_seen LIKE ?", (f"{datetime.now().date().isoformat()}%",)),
+        ("SELECT username, first_name, message_count FROM users ORDER BY last_seen DESC LIMIT 5", ()),
+    ],
+}
+
+NEW_FUNCTIONS = {
+    "get_unsent_offers": lambda: database.get_unsent_offers(10),
+    "get_stats": database.get_stats,
+    "get_download_stats": database.get_download_stats,
+    "get_user_stats": database.get_user_stats,
+}
+
+
+def populate_legacy(path, rows):
+    """قاعدة بالشكل القديم (الإصدار 1: تواريخ نصية وبدون فهارس)"""
+    conn = sqlite3.connect(path, isolation_level=None)
+    c = conn.cursor()
+    c.execute("BEGIN")
+    database._migrate_base_schema(c)
+    c.execute("PRAGMA user_version = 1")
+    now = datetime.now()
+
+    def iso(seconds_ago):
+        return (now - timedelta(seconds=seconds_ago)).isoformat()
+
+    # 99% من العروض منشورة - الحالة الواقعية بعد فترة تشغيل
+    c.executemany(
+        "INSERT INTO offers (title, link, source, is_sent) VALUES (?, ?, ?, ?)",
+        ((f"offer {i}", f"https://example.com/o/{i}", "bench", 0 if random.random() < 0.01 else 1) for i in range(rows)),
+    )
+    c.executemany(
+        "INSERT INTO download_stats (platform, success, timestamp) VALUES (?, ?, ?)",
+        ((random.choice(PLATFORMS), 1 if random.random() < 0.85 else 0, iso(random.randint(0, 90 * 86400))) for _ in range(rows)),
+    )
+    c.executemany(
+        "INSERT INTO users (user_id, username, first_name, first_seen, last_seen, message_count) VALUES (?, ?, ?, ?, ?, ?)",
+        ((i, f"user{i}", "User", iso(90 * 86400), iso(random.randint(0, 90 * 86400)), random.randint(1, 50)) for i in range(rows)),
+    )
+    c.execute("COMMIT")
+    conn.close()
+
+
+def timed(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        # قياس القاعدة نفسها وليس الذاكرة المؤقتة
+        database._stats_cache.clear()
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return samples[len(samples) // 2] * 1000
+
+
+def run_legacy(path, queries):
+    def run():
+        conn = sqlite3.connect(path)
+        for sql, params in queries:
+            conn.execute(sql, params).fetchall()
+        conn.close()
+    return run
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    path = os.path.join(workdir, "bench.db")
+    database.DATABASE_FILE = path
+
+    print(f"Populating {args.rows:,} rows per table...")
+    start = time.perf_counter()
+    populate_legacy(path, args.rows)
+    print(f"  done in {time.perf_counter() - start:.1f}s")
+
+    before = {name: timed(run_legacy(path, queries), args.repeat) for name, queries in LEGACY_QUERIES.items()}
+
+    print("Migrating...")
+    start = time.perf_counter()
+    conn = sqlite3.connect(path, isolation_level=None)
+    database.migrate(conn)
+    conn.close()
+    print(f"  done in {time.perf_counter() - start:.1f}s")
+
+    after = {name: timed(func, args.repeat) for name, func in NEW_FUNCTIONS.items()}
+
+    print(f"\n{'query':<22}{'before (ms)':>14}{'after (ms)':>14}{'speedup':>10}")
+    for name in NEW_FUNCTIONS:
+        speedup = before[name] / after[name] if after[name] else float('inf')
+        print(f"{name:<22}{before[name]:>14.2f}{after[name]:>14.2f}{speedup:>9.1f}x")
+    print(f"\nDatabase size: {os.path.getsize(path) / 1e6:.1f} MB")
+    shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
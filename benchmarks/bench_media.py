@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+"""
+قياس أداء أدوات الوسائط (handlers/media_tools.py و create_offer_image)
+
+كل دوال download_* تعمل ضد خادم aiohttp محلي يقلّد واجهات المزودين (JSON/HTML)
+والـ CDN (ملفات فيديو بأحجام مختلفة) - بدون إنترنت.
+أدوات الصور تعمل على مجموعة صور مولّدة (أو مجلد صور عبر --images).
+
+النتائج: العمليات/ثانية، p50/p99 بالمللي ثانية، وأعلى استهلاك ذاكرة (RSS) لكل اختبار.
+
+الاستخدام:
+    python benchmarks/bench_media.py
+    python benchmarks/bench_media.py --save-baseline baseline.json
+    python benchmarks/bench_media.py --baseline baseline.json   # مقارنة مع قياس سابق
+    python benchmarks/bench_media.py --bot-dir .   # النسخة في جذر المستودع بدل بوت العروض
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import warnings
+from io import BytesIO
+
+import aiohttp
+from aiohttp import web
+from PIL import Image, ImageDraw
+from yarl import URL
+
+BOT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "telegram-offers-bot")
+
+# الخادم المحلي يحتاج وراثة ClientSession (غير مستحبة في aiohttp لكنها تعمل)
+warnings.filterwarnings("ignore", message="Inheritance class StubSession")
+
+STUB_PORT = 8931
+CDN = "https://cdn.stub"
+VIDEO_SIZES = {"256k": 256 * 1024, "4m": 4 * 1024 * 1024, "32m": 32 * 1024 * 1024}
+IMAGE_SIZES = {"640x480": (640, 480), "1280x720": (1280, 720), "1080x2340": (1080, 2340)}
+FONT_CANDIDATES = [
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf",
+    "/usr/share/fonts/truetype/noto/NotoSansArabic-Bold.ttf",
+    "/Library/Fonts/Arial Unicode.ttf",
+]
+
+
+# ===== خادم المزودين الوهمي =====
+
+def video_url(size):
+    return f"{CDN}/video/{size}.mp4"
+
+
+def provider_routes(blob, state):
+    """رد كل مزود بنفس شكل الواجهة الحقيقية - المسار: /<host>/<path>
+
+    state["size"]: حجم الفيديو الذي يرجعه الـ CDN في الجولة الحالية
+    """
+
+    def size_of(request):
+        return request.query.get("size") or state["size"]
+
+    async def tikwm(request):
+        return web.json_response({"code": 0, "data": {"play": video_url(size_of(request))}})
+
+    async def igram(request):
+        return web.json_response({"items": [{"url": video_url(size_of(request)), "type": "video"}]})
+
+    async def pinterest(request):
+        return web.json_response({"data": [{"images": {"orig": {"url": video_url(size_of(request))}}}]})
+
+    async def media_url_page(request):
+        return web.Response(text=f'<script>{{"media_url":"{video_url(size_of(request))}"}}</script>', content_type="text/html")
+
+    async def play_url_page(request):
+        return web.Response(text=f'<script>{{"playUrl":"{video_url(size_of(request))}"}}</script>', content_type="text/html")
+
+    async def href_page(request):
+        return web.Response(text=f'<a href="{video_url(size_of(request))}?video=1">mp4</a>', content_type="text/html")
+
+    async def fdownloader(request):
+        return web.json_response({"links": {"download": [{"url": video_url(size_of(request))}]}})
+
+    async def cobalt(request):
+        return web.json_response({"url": video_url(size_of(request))})
+
+    async def cdn(request):
+        size = VIDEO_SIZES[request.match_info["size"]]
+        return web.Response(body=blob[:size], content_type="video/mp4")
+
+    return [
+        web.get("/www.tikwm.com/api/", tikwm),
+        web.post("/api.igram.io/api/ig", igram),
+        web.get("/api.pinterest.com/v3/pidgets/pins/info/", pinterest),
+        web.get("/www.snapchat.com/{tail:.*}", media_url_page),
+        web.get("/api.vevioz.com/{tail:.*}", href_page),
+        web.get("/twitsave.com/info", href_page),
+        web.post("/www.fdownloader.net/api/ajaxSearch", fdownloader),
+        web.get("/likee.video/{tail:.*}", play_url_page),
+        web.get("/www.kwai.com/{tail:.*}", play_url_page),
+        web.post("/co.wuk.sh/api/json", cobalt),
+        web.get("/cdn.stub/video/{size}.mp4", cdn),
+    ]
+
+
+class StubSession(aiohttp.ClientSession):
+    """كل الطلبات تذهب للخادم المحلي: https://host/path → http://127.0.0.1:PORT/host/path"""
+
+    def _request(self, method, str_or_url, **kwargs):
+        url = URL(str(str_or_url))
+        local = URL.build(
+            scheme="http", host="127.0.0.1", port=STUB_PORT,
+            path=f"/{url.host}{url.path}", query=url.query,
+        )
+        return super()._request(method, local, **kwargs)
+
+
+# (الدالة، رابط المستخدم) - الرابط يطابق ما تتوقعه الدالة
+DOWNLOADS = {
+    "download_tiktok": "https://www.tiktok.com/@user/video/1",
+    "download_instagram": "https://www.instagram.com/reel/abc/",
+    "download_pinterest": "https://www.pinterest.com/pin/123456/",
+    "download_snapchat": "https://www.snapchat.com/spotlight/abc",
+    "download_youtube": "https://www.youtube.com/shorts/abc",
+    "download_twitter": "https://x.com/user/status/1",
+    "download_facebook": "https://www.facebook.com/watch/?v=1",
+    "download_likee": "https://likee.video/v/abc",
+    "download_kwai": "https://www.kwai.com/video/abc",
+    "download_generic": "https://example.com/video",
+}
+
+
+# ===== الصور =====
+
+def generate_corpus():
+    """صور اختبار: منتج على خلفية بيضاء، صورة بعلامة مائية ونص، ولقطة شاشة جوال"""
+    corpus = {}
+    for label, (w, h) in IMAGE_SIZES.items():
+        img = Image.new("RGB", (w, h), "white")
+        draw = ImageDraw.Draw(img)
+        draw.ellipse((w // 4, h // 4, 3 * w // 4, 3 * h // 4), fill=(200, 60, 40))
+        # علامة مائية فاتحة ونص داكن
+        draw.text((w // 2, h - 40), "WATERMARK", fill=(235, 235, 235))
+        for y in range(h // 8, h // 4, 24):
+            draw.text((20, y), "sample text line", fill=(10, 10, 10))
+        # شريط الحالة وشريط التنقل
+        draw.rectangle((0, 0, w, int(h * 0.04)), fill=(0, 0, 0))
+        draw.rectangle((0, int(h * 0.95), w, h), fill=(20, 20, 20))
+        buf = BytesIO()
+        img.save(buf, format="PNG")
+        corpus[label] = buf.getvalue()
+    return corpus
+
+
+def load_corpus(directory):
+    corpus = {}
+    for name in sorted(os.listdir(directory)):
+        if name.lower().endswith((".png", ".jpg", ".jpeg", ".webp")):
+            with open(os.path.join(directory, name), "rb") as f:
+                corpus[os.path.splitext(name)[0]] = f.read()
+    return corpus
+
+
+# ===== القياس =====
+
+class RSSSampler:
+    """أعلى RSS أثناء الاختبار (/proc على لينكس، وإلا ru_maxrss للعملية كلها)"""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def current():
+        try:
+            with open("/proc/self/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1]) * 1024
+        except OSError:
+            pass
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, self.current())
+
+    def __enter__(self):
+        self.peak = self.current()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.current())
+
+
+def percentile(samples, pct):
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+async def measure(call, repeat):
+    """تشغيل call() عدة مرات - يرجع ملخص الزمن والذاكرة أو None إذا فشلت الدالة"""
+    samples = []
+    with RSSSampler() as rss:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = call()
+            if asyncio.iscoroutine(result):
+                result = await result
+            samples.append(time.perf_counter() - start)
+            if not result:
+                return None
+    samples.sort()
+    return {
+        "ops_per_sec": len(samples) / sum(samples),
+        "p50_ms": percentile(samples, 50) * 1000,
+        "p99_ms": percentile(samples, 99) * 1000,
+        "peak_rss_mb": rss.peak / 1e6,
+    }
+
+
+async def run_downloads(media_tools, sizes, repeat):
+    blob = os.urandom(max(VIDEO_SIZES[s] for s in sizes))
+    state = {}
+    app = web.Application()
+    app.add_routes(provider_routes(blob, state))
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", STUB_PORT).start()
+
+    results = {}
+    original = media_tools.aiohttp.ClientSession
+    media_tools.aiohttp.ClientSession = StubSession
+    try:
+        for size in sizes:
+            state["size"] = size
+            for name, url in DOWNLOADS.items():
+                func = getattr(media_tools, name, None)
+                if func is None:
+                    continue
+                results[f"{name}[{size}]"] = await measure(lambda: func(url), repeat)
+    finally:
+        media_tools.aiohttp.ClientSession = original
+        await runner.cleanup()
+    return results
+
+
+async def run_images(media_tools, utils, corpus, repeat):
+    results = {}
+    tools = {
+        "simple_white_removal": media_tools.simple_white_removal,
+        "remove_watermark": media_tools.remove_watermark,
+        "remove_text_from_image": media_tools.remove_text_from_image,
+        "crop_phone_frame": media_tools.crop_phone_frame,
+    }
+    for label, image in corpus.items():
+        for name, tool in tools.items():
+            results[f"{name}[{label}]"] = await measure(lambda: tool(image), repeat)
+
+    if utils.load_font(50) is None:
+        print("  create_offer_image skipped: no font (use --font)")
+    else:
+        results["create_offer_image"] = await measure(
+            lambda: utils.create_offer_image(None, "خصم ٥٠٪ على الإلكترونيات", "50%", "نون", "إلكترونيات"),
+            repeat,
+        )
+    return results
+
+
+def print_results(results, baseline=None):
+    header = f"{'benchmark':<40}{'ops/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'RSS MB':>10}"
+    if baseline:
+        header += f"{'p50 Δ':>10}{'p99 Δ':>10}"
+    print("\n" + header)
+    for name, r in results.items():
+        if r is None:
+            print(f"{name:<40}{'failed':>10}")
+            continue
+        line = f"{name:<40}{r['ops_per_sec']:>10.1f}{r['p50_ms']:>10.1f}{r['p99_ms']:>10.1f}{r['peak_rss_mb']:>10.0f}"
+        base = (baseline or {}).get(name)
+        if base:
+            line += f"{(r['p50_ms'] / base['p50_ms'] - 1) * 100:>+9.0f}%{(r['p99_ms'] / base['p99_ms'] - 1) * 100:>+9.0f}%"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--sizes", default=",".join(VIDEO_SIZES), help="video sizes: " + ",".join(VIDEO_SIZES))
+    parser.add_argument("--images", help="directory with images instead of the generated corpus")
+    parser.add_argument("--font", help="TTF font for create_offer_image")
+    parser.add_argument("--only", choices=["downloads", "images"])
+    parser.add_argument("--bot-dir", default=BOT_DIR, help="directory with handlers/ and utils.py (default: telegram-offers-bot)")
+    parser.add_argument("--baseline", help="compare with a saved JSON result")
+    parser.add_argument("--save-baseline", help="save results as JSON")
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.abspath(args.bot_dir))
+
+    # utils يحمّل الخط عند الاستيراد من مجلد العمل - نعطيه خطاً محلياً بدل الإنترنت
+    workdir = tempfile.mkdtemp()
+    font = args.font or next((p for p in FONT_CANDIDATES if os.path.exists(p)), None)
+    if font:
+        shutil.copy(font, os.path.join(workdir, "arabic_font.ttf"))
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        import utils  # noqa: E402
+        from handlers import media_tools  # noqa: E402
+
+        results = {}
+        if args.only != "images":
+            print("Downloads against local stub server...")
+            results.update(asyncio.run(run_downloads(media_tools, args.sizes.split(","), args.repeat)))
+        if args.only != "downloads":
+            corpus = load_corpus(args.images) if args.images else generate_corpus()
+            print(f"Image tools on {len(corpus)} images...")
+            results.update(asyncio.run(run_images(media_tools, utils, corpus, args.repeat)))
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nSaved to {args.save_baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+اختبار الحمل لبوت العروض (telegram-offers-bot) قبل كل نشر
+
+يشغّل المعالجات الحقيقية (handle_photo، handle_text ← offers_command/stats_command)
+عبر Application حقيقي، لكن Bot API خادم aiohttp محلي يرد على كل الطلبات.
+آلاف التحديثات المصطنعة تُضخ بمعدلات متزايدة، ولكل معدل:
+المُنجز/ثانية، p50/p95/p99 من دخول التحديث حتى انتهاء معالجته، ونمو الذاكرة.
+
+الاستخدام:
+    python benchmarks/load_bot.py
+    python benchmarks/load_bot.py --rates 50,100,200 --updates 2000 --chats 300
+    python benchmarks/load_bot.py --api-latency 30 --no-photos
+"""
+
+import argparse
+import asyncio
+import gc
+import logging
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from io import BytesIO
+
+from aiohttp import web
+from PIL import Image, ImageDraw
+
+BOT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "telegram-offers-bot")
+sys.path.insert(0, BOT_DIR)
+
+API_PORT = 8932
+TOKEN = "123456:LOADTEST"
+FONT_CANDIDATES = [
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf",
+    "/usr/share/fonts/truetype/noto/NotoSansArabic-Bold.ttf",
+]
+
+# نوع التحديث -> (النسبة، النص أو التعليق)
+TRAFFIC_MIX = {
+    "offers": (0.30, "عروض"),
+    "stats": (0.25, "احصائيات"),
+    "help": (0.25, "مساعدة"),
+    "photo_crop": (0.12, "قص"),
+    "photo_text": (0.08, "نص"),
+}
+
+
+def rss_bytes():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def sample_photo(width=1280, height=960):
+    img = Image.new("RGB", (width, height), (240, 240, 240))
+    draw = ImageDraw.Draw(img)
+    draw.rectangle((0, 0, width, height // 20), fill=(0, 0, 0))
+    for y in range(height // 5, height // 2, 30):
+        draw.text((40, y), "load test text", fill=(20, 20, 20))
+    buf = BytesIO()
+    img.save(buf, format="JPEG", quality=85)
+    return buf.getvalue()
+
+
+# ===== Bot API الوهمي =====
+
+def fake_bot_api(photo, latency):
+    """يرد على كل دوال Bot API برسالة صالحة - latency: تأخير مصطنع بالثواني"""
+    counter = {"message_id": 0, "requests": 0}
+
+    def message(chat_id):
+        counter["message_id"] += 1
+        return {
+            "message_id": counter["message_id"],
+            "date": int(time.time()),
+            "chat": {"id": int(chat_id or 1), "type": "private"},
+        }
+
+    async def api(request):
+        counter["requests"] += 1
+        if latency:
+            await asyncio.sleep(latency)
+        method = request.match_info["method"]
+        if request.content_type == "application/json":
+            data = await request.json()
+        else:
+            data = await request.post()
+
+        if method == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "Load", "username": "load_test_bot"}
+        elif method == "getFile":
+            result = {"file_id": data.get("file_id"), "file_unique_id": "u", "file_size": len(photo), "file_path": "photos/sample.jpg"}
+        elif method.startswith("send") or method.startswith("edit"):
+            result = message(data.get("chat_id"))
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+    async def file(request):
+        if latency:
+            await asyncio.sleep(latency)
+        return web.Response(body=photo, content_type="image/jpeg")
+
+    app = web.Application(client_max_size=64 * 1024 * 1024)
+    app.router.add_post("/bot{token}/{method}", api)
+    app.router.add_get("/file/bot{token}/{path:.*}", file)
+    return app, counter
+
+
+# ===== التحديثات =====
+
+def make_update(update_id, chat_id, kind, photo_size):
+    text = TRAFFIC_MIX[kind][1]
+    message = {
+        "message_id": update_id,
+        "date": int(time.time()),
+        "chat": {"id": chat_id, "type": "private"},
+        "from": {"id": chat_id, "is_bot": False, "first_name": "User"},
+    }
+    if kind.startswith("photo"):
+        message["caption"] = text
+        message["photo"] = [
+            {"file_id": "small", "file_unique_id": "s", "width": 320, "height": 240, "file_size": 20000},
+            {"file_id": "large", "file_unique_id": "l", "width": 1280, "height": 960, "file_size": photo_size},
+        ]
+    else:
+        message["text"] = text
+    return {"update_id": update_id, "message": message}
+
+
+def traffic(count, chats, photos, seed):
+    rng = random.Random(seed)
+    kinds = [k for k in TRAFFIC_MIX if photos or not k.startswith("photo")]
+    weights = [TRAFFIC_MIX[k][0] for k in kinds]
+    return [(rng.randint(1, chats), rng.choices(kinds, weights)[0]) for _ in range(count)]
+
+
+async def run_step(app, updates, rate, next_id, photo_size, timeout):
+    """ضخ التحديثات بمعدل ثابت (حمل مفتوح) وانتظار انتهاء معالجتها"""
+    from telegram import Update
+    from telegram.ext import TypeHandler
+
+    started = {}
+    latencies = []
+    done = asyncio.Event()
+
+    async def on_done(update, context):
+        latencies.append(time.perf_counter() - started.pop(update.update_id))
+        if len(latencies) == len(updates):
+            done.set()
+
+    # المجموعة 1 تعمل بعد انتهاء معالج المجموعة 0 لنفس التحديث
+    handler = TypeHandler(Update, on_done)
+    app.add_handler(handler, group=1)
+
+    gc.collect()
+    rss_before = rss_bytes()
+    begin = time.perf_counter()
+    for i, (chat_id, kind) in enumerate(updates):
+        # انتظار موعد التحديث التالي (بدون تراكم الانحراف)
+        delay = begin + i / rate - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        update_id = next_id + i
+        update = Update.de_json(make_update(update_id, chat_id, kind, photo_size), app.bot)
+        started[update_id] = time.perf_counter()
+        app.update_queue.put_nowait(update)
+
+    try:
+        await asyncio.wait_for(done.wait(), timeout)
+    except asyncio.TimeoutError:
+        pass
+    elapsed = time.perf_counter() - begin
+    app.remove_handler(handler, group=1)
+    gc.collect()
+
+    latencies.sort()
+
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p / 100))] * 1000 if latencies else float("nan")
+
+    return {
+        "offered": rate,
+        "achieved": len(latencies) / elapsed,
+        "completed": len(latencies),
+        "p50": pct(50),
+        "p95": pct(95),
+        "p99": pct(99),
+        "rss_growth_mb": (rss_bytes() - rss_before) / 1e6,
+    }
+
+
+async def run(args, workdir):
+    import database
+    from bot import add_handlers
+    from telegram.ext import Application
+    from update_processor import ChatOrderedUpdateProcessor
+    from config import UPDATE_CONCURRENCY
+
+    # سجلات INFO لكل طلب تبطئ الاختبار نفسه
+    logging.getLogger().setLevel(logging.WARNING)
+
+    database.DATABASE_FILE = os.path.join(workdir, "load.db")
+    database.init_db()
+    database.save_offers([
+        {"title": f"عرض {i}", "link": f"https://example.com/o/{i}", "price": "50%", "source": "load",
+         "image_url": "https://example.com/i.jpg" if i % 2 else None}
+        for i in range(200)
+    ])
+
+    photo = sample_photo()
+    api_app, counter = fake_bot_api(photo, args.api_latency / 1000)
+    runner = web.AppRunner(api_app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", API_PORT).start()
+
+    app = (
+        Application.builder()
+        .token(TOKEN)
+        .base_url(f"http://127.0.0.1:{API_PORT}/bot")
+        .base_file_url(f"http://127.0.0.1:{API_PORT}/file/bot")
+        .concurrent_updates(ChatOrderedUpdateProcessor(args.concurrency or UPDATE_CONCURRENCY))
+        .connection_pool_size(256)
+        .updater(None)
+        .build()
+    )
+    add_handlers(app)
+
+    rss_start = rss_bytes()
+    results = []
+    async with app:
+        await app.start()
+        next_id = 1
+        for step, rate in enumerate(args.rates):
+            updates = traffic(args.updates, args.chats, not args.no_photos, seed=step)
+            print(f"  {rate} updates/s x {len(updates)}...")
+            results.append(await run_step(app, updates, rate, next_id, len(photo), args.timeout))
+            next_id += len(updates)
+        await app.stop()
+    await runner.cleanup()
+
+    print(f"\n{'offered/s':>10}{'achieved/s':>12}{'done':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'RSS Δ MB':>10}")
+    sustainable = None
+    for r in results:
+        print(f"{r['offered']:>10}{r['achieved']:>12.1f}{r['completed']:>8}{r['p50']:>10.1f}{r['p95']:>10.1f}{r['p99']:>10.1f}{r['rss_growth_mb']:>+10.1f}")
+        if r["completed"] == args.updates and r["achieved"] >= 0.95 * r["offered"] and r["p99"] <= args.max_p99:
+            sustainable = r["offered"]
+    print(f"\nSustainable rate: {sustainable or '< ' + str(args.rates[0])} updates/s (p99 <= {args.max_p99:.0f} ms)")
+    print(f"Bot API requests: {counter['requests']:,}, total RSS growth: {(rss_bytes() - rss_start) / 1e6:+.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rates", default="25,50,100,200", type=lambda s: [int(x) for x in s.split(",")])
+    parser.add_argument("--updates", type=int, default=1000, help="updates per rate step")
+    parser.add_argument("--chats", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, help="defaults to UPDATE_CONCURRENCY")
+    parser.add_argument("--api-latency", type=float, default=0, help="fake Bot API delay in ms")
+    parser.add_argument("--max-p99", type=float, default=2000, help="p99 limit in ms for a sustainable step")
+    parser.add_argument("--timeout", type=float, default=120, help="max seconds to drain one step")
+    parser.add_argument("--no-photos", action="store_true", help="text updates only")
+    parser.add_argument("--font", help="TTF font (utils loads one at import)")
+    args = parser.parse_args()
+
+    # المسارات النسبية (القاعدة، الخط) داخل مجلد مؤقت
+    workdir = tempfile.mkdtemp()
+    font = args.font or next((p for p in FONT_CANDIDATES if os.path.exists(p)), None)
+    if font:
+        shutil.copy(font, os.path.join(workdir, "arabic_font.ttf"))
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        asyncio.run(run(args, workdir))
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
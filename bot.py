@@ -26,8 +26,10 @@ from telegram.ext import Application, CommandHandler, ContextTypes, MessageHandl
 
 
 from config import BOT_TOKEN, CHANNEL_ID, ADMIN_IDS, RSS_FEEDS, MESSAGES, SCRAPE_INTERVAL
+from config import USER_STATE_TTL, USER_STATE_MAX_ENTRIES, USER_STATE_PERSIST
 from database import init_db, save_offer, mark_as_sent, get_unsent_offers, get_stats, clear_database, record_download, get_download_stats, track_user, get_user_stats
 from utils import create_offer_image
+from state_store import UserStateStore
 from handlers.media_tools import (
     remove_background, download_video, is_supported_url,
     remove_watermark, remove_text_from_image, crop_phone_frame
@@ -68,7 +70,7 @@ logger = logging.getLogger(__name__)
 
 
 # حالة المستخدم (لتتبع الوضع المختار)
-user_mode = {}
+user_mode = UserStateStore(ttl=USER_STATE_TTL, max_entries=USER_STATE_MAX_ENTRIES, persist=USER_STATE_PERSIST)
 
 
 
@@ -17,6 +17,13 @@ RSS_FEEDS = []  # فارغ - نستخدم المواقع السعودية فقط
 # ===== DATABASE =====
 DATABASE_FILE = "offers.db"
 
+# ===== USER STATE =====
+# وضع المستخدم (الأداة المختارة) ينتهي بعد هذه المدة بالثواني
+USER_STATE_TTL = 3600
+# أقصى عدد حالات في الذاكرة - الأقدم استخداماً يُحذف (ويبقى في القاعدة)
+USER_STATE_MAX_ENTRIES = 10000
+USER_STATE_PERSIST = True
+
 # ===== ARABIC MESSAGES =====
 MESSAGES = {
     "welcome": """
@@ -1,13 +1,23 @@
 import sqlite3
 import os
-from datetime import datetime
+import time
+import math
+import functools
+from datetime import date, datetime, timedelta
 
 DATABASE_FILE = "offers.db"
 
 
-def init_db():
-    conn = sqlite3.connect(DATABASE_FILE)
-    c = conn.cursor()
+# ===== MIGRATIONS =====
+# كل ترحيل يُطبّق مرة واحدة وبالترتيب - رقم الإصدار محفوظ في PRAGMA user_version
+
+def _columns(c, table):
+    c.execute(f"PRAGMA table_info({table})")
+    return {row[1] for row in c.fetchall()}
+
+
+def _migrate_base_schema(c):
+    """الجداول الأساسية (كما كانت قبل نظام الترحيل)"""
     c.execute("""
         CREATE TABLE IF NOT EXISTS offers (
             id INTEGER PRIMARY KEY,
@@ -29,76 +39,399 @@ def init_db():
             timestamp TEXT
         )
     """)
-    try:
-        c.execute("ALTER TABLE offers ADD COLUMN image_url TEXT")
-    except:
-        pass
-    try:
-        c.execute("ALTER TABLE offers ADD COLUMN description TEXT")
-    except:
-        pass
-    conn.commit()
+    c.execute("""CREATE TABLE IF NOT EXISTS users (
+        user_id INTEGER PRIMARY KEY, username TEXT, first_name TEXT,
+        first_seen TEXT, last_seen TEXT, message_count INTEGER DEFAULT 1)""")
+    # قواعد قديمة قبل إضافة هذه الأعمدة
+    columns = _columns(c, "offers")
+    for column in ("image_url", "description"):
+        if column not in columns:
+            c.execute(f"ALTER TABLE offers ADD COLUMN {column} TEXT")
+
+
+def _migrate_epoch_timestamps(c):
+    """تحويل التواريخ النصية (ISO) إلى أرقام epoch بالثواني"""
+    c.execute("""
+        CREATE TABLE download_stats_new (
+            id INTEGER PRIMARY KEY,
+            platform TEXT,
+            success INTEGER DEFAULT 0,
+            timestamp INTEGER
+        )
+    """)
+    c.execute("""
+        INSERT INTO download_stats_new (id, platform, success, timestamp)
+        SELECT id, platform, success, CAST(strftime('%s', timestamp, 'utc') AS INTEGER) FROM download_stats
+    """)
+    c.execute("DROP TABLE download_stats")
+    c.execute("ALTER TABLE download_stats_new RENAME TO download_stats")
+    
+    c.execute("""CREATE TABLE users_new (
+        user_id INTEGER PRIMARY KEY, username TEXT, first_name TEXT,
+        first_seen INTEGER, last_seen INTEGER, message_count INTEGER DEFAULT 1)""")
+    c.execute("""
+        INSERT INTO users_new (user_id, username, first_name, first_seen, last_seen, message_count)
+        SELECT user_id, username, first_name,
+               CAST(strftime('%s', first_seen, 'utc') AS INTEGER),
+               CAST(strftime('%s', last_seen, 'utc') AS INTEGER),
+               message_count
+        FROM users
+    """)
+    c.execute("DROP TABLE users")
+    c.execute("ALTER TABLE users_new RENAME TO users")
+
+
+def _migrate_indexes(c):
+    """فهارس الاستعلامات المتكررة"""
+    # فهرس جزئي: العروض غير المنشورة فقط (صغير مهما كبر الجدول)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_offers_unsent ON offers(id) WHERE is_sent = 0")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_users_last_seen ON users(last_seen)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_download_stats_platform ON download_stats(platform, success, timestamp)")
+
+
+def _migrate_summary_tables(c):
+    """عدادات مجمّعة تُحدَّث بالـ triggers - الإحصائيات لا تمسح الجداول الكبيرة"""
+    c.execute("CREATE TABLE stats_counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL DEFAULT 0)")
+    c.execute("""
+        CREATE TABLE download_daily (
+            day TEXT,
+            platform TEXT,
+            success INTEGER NOT NULL DEFAULT 0,
+            failed INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, platform)
+        )
+    """)
+    c.execute("CREATE TABLE user_activity_daily (day TEXT PRIMARY KEY, active INTEGER NOT NULL DEFAULT 0)")
+    
+    # تعبئة أولية من البيانات الحالية
+    c.execute("""
+        INSERT INTO stats_counters (name, value)
+        SELECT 'offers_total', COUNT(*) FROM offers
+        UNION ALL SELECT 'offers_sent', COALESCE(SUM(is_sent), 0) FROM offers
+        UNION ALL SELECT 'downloads_success', COALESCE(SUM(success), 0) FROM download_stats
+        UNION ALL SELECT 'downloads_failed', COUNT(*) - COALESCE(SUM(success), 0) FROM download_stats
+        UNION ALL SELECT 'users_total', COUNT(*) FROM users
+    """)
+    c.execute("""
+        INSERT INTO download_daily (day, platform, success, failed)
+        SELECT date(timestamp, 'unixepoch', 'localtime'), platform, SUM(success), COUNT(*) - SUM(success)
+        FROM download_stats GROUP BY 1, 2
+    """)
+    c.execute("""
+        INSERT INTO user_activity_daily (day, active)
+        SELECT date(last_seen, 'unixepoch', 'localtime'), COUNT(*) FROM users GROUP BY 1
+    """)
+    
+    c.execute("""
+        CREATE TRIGGER offers_counters_insert AFTER INSERT ON offers BEGIN
+            UPDATE stats_counters SET value = value + 1 WHERE name = 'offers_total';
+            UPDATE stats_counters SET value = value + NEW.is_sent WHERE name = 'offers_sent';
+        END
+    """)
+    c.execute("""
+        CREATE TRIGGER offers_counters_delete AFTER DELETE ON offers BEGIN
+            UPDATE stats_counters SET value = value - 1 WHERE name = 'offers_total';
+            UPDATE stats_counters SET value = value - OLD.is_sent WHERE name = 'offers_sent';
+        END
+    """)
+    c.execute("""
+        CREATE TRIGGER offers_counters_sent AFTER UPDATE OF is_sent ON offers BEGIN
+            UPDATE stats_counters SET value = value + NEW.is_sent - OLD.is_sent WHERE name = 'offers_sent';
+        END
+    """)
+    # لا يوجد trigger للحذف من download_stats: العدادات تراكمية وتبقى بعد حذف السجلات الخام
+    c.execute("""
+        CREATE TRIGGER download_counters_insert AFTER INSERT ON download_stats BEGIN
+            UPDATE stats_counters SET value = value + NEW.success WHERE name = 'downloads_success';
+            UPDATE stats_counters SET value = value + 1 - NEW.success WHERE name = 'downloads_failed';
+            INSERT INTO download_daily (day, platform, success, failed)
+            VALUES (date(NEW.timestamp, 'unixepoch', 'localtime'), NEW.platform, NEW.success, 1 - NEW.success)
+            ON CONFLICT (day, platform) DO UPDATE SET
+                success = success + excluded.success, failed = failed + excluded.failed;
+        END
+    """)
+    c.execute("""
+        CREATE TRIGGER users_counters_insert AFTER INSERT ON users BEGIN
+            UPDATE stats_counters SET value = value + 1 WHERE name = 'users_total';
+            INSERT INTO user_activity_daily (day, active) VALUES (date(NEW.last_seen, 'unixepoch', 'localtime'), 1)
+            ON CONFLICT (day) DO UPDATE SET active = active + 1;
+        END
+    """)
+    c.execute("""
+        CREATE TRIGGER users_counters_delete AFTER DELETE ON users BEGIN
+            UPDATE stats_counters SET value = value - 1 WHERE name = 'users_total';
+        END
+    """)
+    # أول رسالة للمستخدم في يوم جديد
+    c.execute("""
+        CREATE TRIGGER users_activity_update AFTER UPDATE OF last_seen ON users
+        WHEN date(NEW.last_seen, 'unixepoch', 'localtime') != date(OLD.last_seen, 'unixepoch', 'localtime') BEGIN
+            INSERT INTO user_activity_daily (day, active) VALUES (date(NEW.last_seen, 'unixepoch', 'localtime'), 1)
+            ON CONFLICT (day) DO UPDATE SET active = active + 1;
+        END
+    """)
+
+
+def _migrate_download_rollups(c):
+    """مدة التحميل + حاويات ساعية + نسب زمن الاستجابة في الحاويات اليومية"""
+    c.execute("ALTER TABLE download_stats ADD COLUMN duration_ms INTEGER")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_download_stats_timestamp ON download_stats(timestamp)")
+    for column in ("p50_ms", "p95_ms", "p99_ms"):
+        c.execute(f"ALTER TABLE download_daily ADD COLUMN {column} INTEGER")
+    c.execute("""
+        CREATE TABLE download_hourly (
+            hour INTEGER,
+            platform TEXT,
+            success INTEGER NOT NULL DEFAULT 0,
+            failed INTEGER NOT NULL DEFAULT 0,
+            p50_ms INTEGER,
+            p95_ms INTEGER,
+            p99_ms INTEGER,
+            PRIMARY KEY (hour, platform)
+        )
+    """)
+    # حدود آخر تجميع (epoch) - كل ما قبلها تم تجميعه
+    c.execute("INSERT INTO stats_counters (name, value) VALUES ('rollup_hour_mark', 0), ('rollup_day_mark', 0)")
+
+
+def _migrate_user_state(c):
+    """وضع المستخدم الحالي (يبقى بعد إعادة التشغيل)"""
+    c.execute("""
+        CREATE TABLE user_state (
+            user_id INTEGER PRIMARY KEY,
+            mode TEXT NOT NULL,
+            expires_at INTEGER NOT NULL
+        )
+    """)
+    c.execute("CREATE INDEX idx_user_state_expires ON user_state(expires_at)")
+
+
+MIGRATIONS = [
+    (1, _migrate_base_schema),
+    (2, _migrate_epoch_timestamps),
+    (3, _migrate_indexes),
+    (4, _migrate_summary_tables),
+    (5, _migrate_download_rollups),
+    (6, _migrate_user_state),
+]
+
+
+def get_schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn):
+    """تطبيق الترحيلات الناقصة - كل ترحيل في معاملة مستقلة"""
+    version = get_schema_version(conn)
+    for target, migration in MIGRATIONS:
+        if target <= version:
+            continue
+        c = conn.cursor()
+        c.execute("BEGIN IMMEDIATE")
+        try:
+            # عملية أخرى (web و worker عند نفس التشغيل) ربما طبقت الترحيل قبل أن نأخذ القفل
+            version = get_schema_version(conn)
+            if target <= version:
+                c.execute("ROLLBACK")
+                continue
+            migration(c)
+            c.execute(f"PRAGMA user_version = {target}")
+            c.execute("COMMIT")
+        except Exception:
+            c.execute("ROLLBACK")
+            raise
+        print(f"Database migrated to v{target}")
+        version = target
+    return version
+
+
+def init_db():
+    conn = sqlite3.connect(DATABASE_FILE, isolation_level=None)
+    migrate(conn)
     conn.close()
     print("Database ready")
 
 
-def record_download(platform, success):
+# ===== STATS CACHE =====
+# نتائج الإحصائيات تُحفظ لثوانٍ قليلة (أوامر الإحصائيات المتكررة لا تلمس القاعدة)
+STATS_CACHE_TTL = 10
+_stats_cache = {}
+
+
+def _cached_stats(func):
+    @functools.wraps(func)
+    def wrapper():
+        now = time.monotonic()
+        hit = _stats_cache.get(func.__name__)
+        if hit and now - hit[0] < STATS_CACHE_TTL:
+            return hit[1]
+        result = func()
+        _stats_cache[func.__name__] = (now, result)
+        return result
+    return wrapper
+
+
+def _read_counters(c, *names):
+    c.execute(f"SELECT name, value FROM stats_counters WHERE name IN ({','.join('?' * len(names))})", names)
+    values = dict(c.fetchall())
+    return [values.get(name, 0) for name in names]
+
+
+def record_download(platform, success, duration_ms=None):
+    """تسجيل محاولة تحميل - بدون duration_ms تبقى أعمدة p50/p95/p99 فارغة (NULL)
+
+    لا يوجد مستدعٍ في هذه النسخة (bot.py هنا جزء بدون Application)؛ على البوت المستخدم
+    لهذه الوحدة قياس زمن التحميل وتمريره بالمللي ثانية.
+    """
     try:
         conn = sqlite3.connect(DATABASE_FILE)
         c = conn.cursor()
-        c.execute("INSERT INTO download_stats (platform, success, timestamp) VALUES (?, ?, ?)",
-            (platform, 1 if success else 0, datetime.now().isoformat()))
+        c.execute("INSERT INTO download_stats (platform, success, timestamp, duration_ms) VALUES (?, ?, ?, ?)",
+            (platform, 1 if success else 0, int(time.time()), duration_ms))
         conn.commit()
         conn.close()
     except Exception as e:
         print(f"Error recording download: {e}")
 
 
+@_cached_stats
 def get_download_stats():
     try:
         conn = sqlite3.connect(DATABASE_FILE)
         c = conn.cursor()
-        c.execute("SELECT COUNT(*) FROM download_stats WHERE success = 1")
-        success = c.fetchone()[0]
-        c.execute("SELECT COUNT(*) FROM download_stats WHERE success = 0")
-        failed = c.fetchone()[0]
+        success, failed = _read_counters(c, 'downloads_success', 'downloads_failed')
         conn.close()
         return {"success": success, "failed": failed, "total": success + failed}
     except:
         return {"success": 0, "failed": 0, "total": 0}
 
 
+def get_daily_download_stats(days=7):
+    """التحميلات لكل يوم ولكل منصة (من الجدول المجمّع)"""
+    try:
+        conn = sqlite3.connect(DATABASE_FILE)
+        c = conn.cursor()
+        since = (date.today() - timedelta(days=days - 1)).isoformat()
+        c.execute("""SELECT day, platform, success, failed, p50_ms, p95_ms, p99_ms
+            FROM download_daily WHERE day >= ? ORDER BY day, platform""", (since,))
+        rows = c.fetchall()
+        conn.close()
+        return rows
+    except:
+        return []
+
+
+def get_hourly_download_stats(hours=24):
+    """التحميلات لكل ساعة ولكل منصة مع زمن الاستجابة (من الحاويات المجمّعة)"""
+    try:
+        conn = sqlite3.connect(DATABASE_FILE)
+        c = conn.cursor()
+        since = int(time.time()) // 3600 * 3600 - (hours - 1) * 3600
+        c.execute("""SELECT hour, platform, success, failed, p50_ms, p95_ms, p99_ms
+            FROM download_hourly WHERE hour >= ? ORDER BY hour, platform""", (since,))
+        rows = c.fetchall()
+        conn.close()
+        return rows
+    except:
+        return []
+
+
+# ===== ROLLUPS & RETENTION =====
+# مكتبة فقط: لا شيء في هذه النسخة يجدول compact_download_stats - على البوت المستخدم لها
+# تسجيلها كمهمة دورية (مثلاً job_queue.run_repeating(..., interval=3600))، وإلا لا تُجمّع
+# الحاويات ولا تُحذف السجلات الخام
+# السجلات الخام تُحذف بعد هذه المدة (بعد تجميعها في الحاويات الساعية واليومية)
+RAW_DOWNLOAD_RETENTION_DAYS = 14
+
+
+def _percentiles(durations):
+    """p50/p95/p99 (nearest-rank) - None إذا لا توجد قياسات"""
+    values = sorted(d for d in durations if d is not None)
+    if not values:
+        return None, None, None
+    return tuple(values[max(0, math.ceil(p / 100 * len(values)) - 1)] for p in (50, 95, 99))
+
+
+def compact_download_stats(retention_days=RAW_DOWNLOAD_RETENTION_DAYS, now=None):
+    """تجميع سجلات التحميل الخام في حاويات ساعية ويومية ثم حذف القديم منها
+
+    تُشغّل دورياً - كل ساعة مكتملة تُجمّع مرة واحدة، وكل يوم مكتمل تُحسب نسبه مرة واحدة.
+    الجدولة مسؤولية المستدعي (انظر أعلى القسم)، والنسب تُحسب فقط من سجلات فيها duration_ms.
+    دالة متزامنة تحجز القاعدة - من async تُستدعى عبر run_in_executor.
+    """
+    now = int(now or time.time())
+    hour_end = now - now % 3600
+    day_end = int(datetime.combine(date.fromtimestamp(now), datetime.min.time()).timestamp())
+    # لا نحذف سجلات يوم لم تُحسب نسبه اليومية بعد
+    prune_before = min(now - max(retention_days, 1) * 86400, day_end)
+    
+    conn = sqlite3.connect(DATABASE_FILE, isolation_level=None)
+    c = conn.cursor()
+    try:
+        c.execute("BEGIN IMMEDIATE")
+        hour_mark, day_mark = _read_counters(c, 'rollup_hour_mark', 'rollup_day_mark')
+        
+        # الحاويات الساعية
+        hourly = {}
+        c.execute("""SELECT timestamp - timestamp % 3600, platform, success, duration_ms FROM download_stats
+            WHERE timestamp >= ? AND timestamp < ?""", (hour_mark, hour_end))
+        for hour, platform, success, duration_ms in c.fetchall():
+            bucket = hourly.setdefault((hour, platform), [0, 0, []])
+            bucket[0 if success else 1] += 1
+            bucket[2].append(duration_ms)
+        c.executemany("INSERT OR REPLACE INTO download_hourly VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(hour, platform, ok, failed, *_percentiles(durations))
+             for (hour, platform), (ok, failed, durations) in hourly.items()])
+        
+        # نسب زمن الاستجابة اليومية (العدادات اليومية تُحدَّث مباشرة بالـ trigger)
+        daily = {}
+        c.execute("""SELECT date(timestamp, 'unixepoch', 'localtime'), platform, duration_ms FROM download_stats
+            WHERE timestamp >= ? AND timestamp < ? AND duration_ms IS NOT NULL""", (day_mark, day_end))
+        for day, platform, duration_ms in c.fetchall():
+            daily.setdefault((day, platform), []).append(duration_ms)
+        c.executemany("UPDATE download_daily SET p50_ms = ?, p95_ms = ?, p99_ms = ? WHERE day = ? AND platform = ?",
+            [(*_percentiles(durations), day, platform) for (day, platform), durations in daily.items()])
+        
+        c.execute("UPDATE stats_counters SET value = ? WHERE name = 'rollup_hour_mark'", (max(hour_mark, hour_end),))
+        c.execute("UPDATE stats_counters SET value = ? WHERE name = 'rollup_day_mark'", (max(day_mark, day_end),))
+        
+        c.execute("DELETE FROM download_stats WHERE timestamp < ?", (prune_before,))
+        pruned = c.rowcount
+        c.execute("COMMIT")
+        return {"hours": len(hourly), "days": len(daily), "pruned": pruned}
+    except Exception as e:
+        if conn.in_transaction:
+            c.execute("ROLLBACK")
+        print(f"Error compacting download stats: {e}")
+        return {"hours": 0, "days": 0, "pruned": 0}
+    finally:
+        conn.close()
+
+
 def track_user(user_id, username=None, first_name=None):
     try:
         conn = sqlite3.connect(DATABASE_FILE)
         c = conn.cursor()
-        c.execute("""CREATE TABLE IF NOT EXISTS users (
-            user_id INTEGER PRIMARY KEY, username TEXT, first_name TEXT,
-            first_seen TEXT, last_seen TEXT, message_count INTEGER DEFAULT 1)""")
-        now = datetime.now().isoformat()
-        c.execute("SELECT message_count FROM users WHERE user_id = ?", (user_id,))
-        existing = c.fetchone()
-        if existing:
-            c.execute("UPDATE users SET username=?, first_name=?, last_seen=?, message_count=message_count+1 WHERE user_id=?",
-                (username, first_name, now, user_id))
-        else:
-            c.execute("INSERT INTO users (user_id, username, first_name, first_seen, last_seen) VALUES (?, ?, ?, ?, ?)",
-                (user_id, username, first_name, now, now))
+        now = int(time.time())
+        c.execute("""INSERT INTO users (user_id, username, first_name, first_seen, last_seen) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(user_id) DO UPDATE SET username=excluded.username, first_name=excluded.first_name,
+            last_seen=excluded.last_seen, message_count=message_count+1""",
+            (user_id, username, first_name, now, now))
         conn.commit()
         conn.close()
     except Exception as e:
         print(f"Error tracking user: {e}")
 
 
+@_cached_stats
 def get_user_stats():
     try:
         conn = sqlite3.connect(DATABASE_FILE)
         c = conn.cursor()
-        c.execute("SELECT COUNT(*) FROM users")
-        total = c.fetchone()[0]
-        today = datetime.now().date().isoformat()
-        c.execute("SELECT COUNT(*) FROM users WHERE last_seen LIKE ?", (f"{today}%",))
-        today_active = c.fetchone()[0]
+        total, = _read_counters(c, 'users_total')
+        c.execute("SELECT active FROM user_activity_daily WHERE day = ?", (date.today().isoformat(),))
+        row = c.fetchone()
+        today_active = row[0] if row else 0
         c.execute("SELECT username, first_name, message_count FROM users ORDER BY last_seen DESC LIMIT 5")
         recent = c.fetchall()
         conn.close()
@@ -107,6 +440,60 @@ def get_user_stats():
         return {"total": 0, "today_active": 0, "recent": []}
 
 
+def load_user_state(user_id):
+    """يرجع (mode, expires_at) أو None - الحالة المنتهية لهذا المستخدم تُحذف"""
+    try:
+        conn = sqlite3.connect(DATABASE_FILE)
+        c = conn.cursor()
+        c.execute("DELETE FROM user_state WHERE user_id = ? AND expires_at <= ?", (user_id, int(time.time())))
+        if c.rowcount:
+            conn.commit()
+        c.execute("SELECT mode, expires_at FROM user_state WHERE user_id = ? AND expires_at > ?", (user_id, int(time.time())))
+        row = c.fetchone()
+        conn.close()
+        return row
+    except Exception as e:
+        print(f"Error loading user state: {e}")
+        return None
+
+
+def save_user_state(user_id, mode, expires_at):
+    try:
+        conn = sqlite3.connect(DATABASE_FILE)
+        c = conn.cursor()
+        c.execute("INSERT OR REPLACE INTO user_state (user_id, mode, expires_at) VALUES (?, ?, ?)", (user_id, mode, expires_at))
+        conn.commit()
+        conn.close()
+    except Exception as e:
+        print(f"Error saving user state: {e}")
+
+
+def delete_user_state(user_id):
+    try:
+        conn = sqlite3.connect(DATABASE_FILE)
+        c = conn.cursor()
+        c.execute("DELETE FROM user_state WHERE user_id = ?", (user_id,))
+        conn.commit()
+        conn.close()
+    except Exception as e:
+        print(f"Error deleting user state: {e}")
+
+
+def purge_user_state():
+    """حذف الحالات المنتهية - يرجع عدد المحذوف"""
+    try:
+        conn = sqlite3.connect(DATABASE_FILE)
+        c = conn.cursor()
+        c.execute("DELETE FROM user_state WHERE expires_at <= ?", (int(time.time()),))
+        deleted = c.rowcount
+        conn.commit()
+        conn.close()
+        return deleted
+    except Exception as e:
+        print(f"Error purging user state: {e}")
+        return 0
+
+
 def save_offer(title, link, price=None, category=None, source=None, image_url=None, description=None):
     if not link:
         return False
@@ -128,7 +515,7 @@ def get_unsent_offers(limit=10):
     conn = sqlite3.connect(DATABASE_FILE)
     conn.row_factory = sqlite3.Row
     c = conn.cursor()
-    c.execute("SELECT * FROM offers WHERE is_sent = 0 LIMIT ?", (limit,))
+    c.execute("SELECT * FROM offers WHERE is_sent = 0 ORDER BY id LIMIT ?", (limit,))
     rows = c.fetchall()
     conn.close()
     return rows
@@ -142,13 +529,11 @@ def mark_as_sent(link):
     conn.close()
 
 
+@_cached_stats
 def get_stats():
     conn = sqlite3.connect(DATABASE_FILE)
     c = conn.cursor()
-    c.execute("SELECT COUNT(*) FROM offers")
-    total = c.fetchone()[0]
-    c.execute("SELECT COUNT(*) FROM offers WHERE is_sent = 1")
-    sent = c.fetchone()[0]
+    total, sent = _read_counters(c, 'offers_total', 'offers_sent')
     conn.close()
     return {"total": total, "sent": sent, "pending": total - sent}
 
@@ -159,4 +544,5 @@ def clear_database():
     c.execute("DELETE FROM offers")
     conn.commit()
     conn.close()
+    _stats_cache.clear()
     print("Database cleared")
@@ -0,0 +1,98 @@
+"""
+مخزن حالة المستخدم - User State Store
+بديل محدود الحجم لـ dict: انتهاء صلاحية (TTL) + حذف الأقدم استخداماً + حفظ اختياري في SQLite
+"""
+
+import sys
+import time
+from collections import OrderedDict
+
+import database
+
+# مدة تذكّر "لا توجد حالة" حتى لا نسأل القاعدة عن نفس المستخدم كل رسالة
+MISSING_TTL = 300
+# لا يوجد مُجدوِل هنا - get() يحذف المنتهي من الذاكرة والقاعدة مرة كل هذه المدة
+PURGE_INTERVAL = 3600
+
+
+class UserStateStore:
+    """حالة المستخدم (الوضع المختار) مع TTL وحد أقصى للذاكرة"""
+
+    def __init__(self, ttl=3600, max_entries=10000, persist=False):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.persist = persist
+        # user_id -> (mode, expires_at) بالترتيب من الأقدم استخداماً للأحدث
+        self._entries = OrderedDict()
+        self._next_purge = int(time.time()) + PURGE_INTERVAL
+
+    def _remember(self, user_id, mode, expires_at):
+        self._entries[user_id] = (mode, expires_at)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, user_id, default=None):
+        now = int(time.time())
+        if now >= self._next_purge:
+            self._next_purge = now + PURGE_INTERVAL
+            self.purge_expired()
+        entry = self._entries.get(user_id)
+        if entry is None and self.persist:
+            row = database.load_user_state(user_id)
+            entry = (sys.intern(row[0]), row[1]) if row else (None, now + min(self.ttl, MISSING_TTL))
+            self._remember(user_id, *entry)
+        if entry is None:
+            return default
+        mode, expires_at = entry
+        if expires_at <= now:
+            del self._entries[user_id]
+            if self.persist and mode is not None:
+                database.delete_user_state(user_id)
+            return default
+        self._entries.move_to_end(user_id)
+        return default if mode is None else mode
+
+    def __getitem__(self, user_id):
+        mode = self.get(user_id)
+        if mode is None:
+            raise KeyError(user_id)
+        return mode
+
+    def __setitem__(self, user_id, mode):
+        expires_at = int(time.time()) + self.ttl
+        # النصوص المتكررة (أسماء الأوضاع) تُشارك نفس الكائن
+        mode = sys.intern(mode)
+        self._remember(user_id, mode, expires_at)
+        if self.persist:
+            database.save_user_state(user_id, mode, expires_at)
+
+    def __delitem__(self, user_id):
+        if self.pop(user_id) is None:
+            raise KeyError(user_id)
+
+    def __contains__(self, user_id):
+        return self.get(user_id) is not None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def pop(self, user_id, default=None):
+        mode = self.get(user_id)
+        if not self.persist:
+            self._entries.pop(user_id, None)
+        else:
+            self._remember(user_id, None, int(time.time()) + min(self.ttl, MISSING_TTL))
+            if mode is not None:
+                database.delete_user_state(user_id)
+        return default if mode is None else mode
+
+    def purge_expired(self):
+        """حذف الحالات المنتهية من الذاكرة والقاعدة - يرجع عدد المحذوف من الذاكرة"""
+        now = int(time.time())
+        expired = [user_id for user_id, (_, expires_at) in self._entries.items() if expires_at <= now]
+        for user_id in expired:
+            del self._entries[user_id]
+        if self.persist:
+            database.purge_user_state()
+        return len(expired)
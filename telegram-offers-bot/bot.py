@@ -5,43 +5,52 @@
 """
 
 import re
+import asyncio
 import logging
 from datetime import datetime
 
 from telegram import Update
+from telegram.error import RetryAfter, TelegramError
 from telegram.ext import Application, CommandHandler, ContextTypes, MessageHandler, filters
 
-from config import BOT_TOKEN, CHANNEL_ID, ADMIN_IDS, RSS_FEEDS, MESSAGES, SCRAPE_INTERVAL
-from database import init_db, save_offer, mark_as_sent, get_unsent_offers, get_stats, clear_database
-from utils import create_offer_image
-from handlers.media_tools import (
-    remove_background, download_video, is_supported_url,
-    remove_watermark, remove_text_from_image, crop_phone_frame
+from config import (
+    BOT_TOKEN, CHANNEL_ID, ADMIN_IDS, RSS_FEEDS, MESSAGES, SCRAPE_INTERVAL, SEND_PIPELINE_DEPTH,
+    OFFER_MAX_AGE_DAYS, EXPIRE_BATCH_SIZE, EXPIRE_MAX_BATCHES, VACUUM_PAGES_PER_RUN, MAINTENANCE_INTERVAL,
+    BOT_MODE, WEBHOOK_URL, WEBHOOK_SECRET, PORT, UPDATE_CONCURRENCY, MEDIA_QUEUE, JOB_RETENTION_SECONDS,
+    DOCUMENT_MAX_BYTES
+)
+from database import (
+    init_db, save_offer, save_offers, mark_as_sent, mark_many_as_sent, get_unsent_offers, get_stats,
+    expire_offers_batch, incremental_vacuum, enqueue_media_job, is_media_job_queued, purge_media_jobs
 )
+from utils import create_offer_image
+from sender import get_sender
+from update_processor import ChatOrderedUpdateProcessor
+from metrics import timed, HANDLER_SECONDS
+from tracing import span
+from handlers.media_tools import is_supported_url
+from handlers.media_jobs import detect_image_modes, image_start_message, pick_photo_size, run_image_job, run_download_job
 
 # Setup logging
 logging.basicConfig(format='%(asctime)s - %(levelname)s - %(message)s', level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# السحب له الأولوية - الصيانة تنتظر انتهاءه
+scrape_lock = asyncio.Lock()
+
 
 # ============== COMMANDS ==============
 
 async def debug_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """فحص المصادر"""
+    """فحص المصادر (بالتوازي)"""
     await update.message.reply_text("🔍 جاري الفحص...")
+    from scrapers import scrape_all, build_sources
     results = []
-    try:
-        from scrapers.rss_scraper import scrape_almowafir_deals
-        r = scrape_almowafir_deals()
-        results.append(f"الموفر: {len(r)}")
-    except Exception as e:
-        results.append(f"الموفر خطأ: {e}")
-    try:
-        from scrapers.rss_scraper import scrape_delivery_apps
-        r = scrape_delivery_apps()
-        results.append(f"توصيل: {len(r)}")
-    except Exception as e:
-        results.append(f"توصيل خطأ: {e}")
+    for source, count, error in await scrape_all(build_sources(RSS_FEEDS), conditional=False):
+        if error:
+            results.append(f"{source['label']} خطأ: {error}")
+        else:
+            results.append(f"{source['label']}: {count}")
     await update.message.reply_text("\n".join(results) if results else "لا نتائج")
 
 
@@ -70,14 +79,26 @@ async def refresh_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def perform_scrape(context: ContextTypes.DEFAULT_TYPE):
     """وظيفة السحب والنشر المشتركة (للتحديث اليدوي والتلقائي)"""
+    async with scrape_lock:
+        return await _perform_scrape(context)
+
+
+async def _perform_scrape(context: ContextTypes.DEFAULT_TYPE):
     try:
-        from scrapers import fetch_all_rss_feeds
-        offers = fetch_all_rss_feeds(RSS_FEEDS)
-        
+        from scrapers import scrape_all, build_sources
+        loop = asyncio.get_running_loop()
         count = 0
-        for offer in offers:
-            if save_offer(offer['title'], offer['link'], offer.get('price'), offer.get('category'), offer.get('source'), offer.get('image_url'), offer.get('description')):
-                count += 1
+        
+        # حفظ عروض كل مصدر دفعة واحدة فور انتهائه بدل انتظار كل المصادر
+        async def store(source, offers):
+            nonlocal count
+            new_offers = await loop.run_in_executor(None, save_offers, offers)
+            if new_offers is None:
+                # scrape_all لا يحفظ حالة صفحات هذا المصدر - تُسحب كاملة في المرة القادمة
+                raise RuntimeError(f"save_offers failed for {source['name']}")
+            count += len(new_offers)
+        
+        await scrape_all(build_sources(RSS_FEEDS), on_result=store)
         
         if count > 0:
             await post_to_channel(context.application)
@@ -93,6 +114,34 @@ async def scheduled_scrape_job(context: ContextTypes.DEFAULT_TYPE):
     await perform_scrape(context)
 
 
+async def expire_old_offers(max_batches=None) -> int:
+    """حذف العروض القديمة على دفعات - كل دفعة معاملة قصيرة مستقلة"""
+    loop = asyncio.get_running_loop()
+    total = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        deleted = await loop.run_in_executor(None, expire_offers_batch, OFFER_MAX_AGE_DAYS, EXPIRE_BATCH_SIZE)
+        total += deleted
+        batches += 1
+        if deleted < EXPIRE_BATCH_SIZE:
+            break
+        await asyncio.sleep(0.1)
+    return total
+
+
+async def maintenance_job(context: ContextTypes.DEFAULT_TYPE):
+    """صيانة دورية في وقت الفراغ: حذف القديم ثم إعادة المساحة تدريجياً"""
+    if scrape_lock.locked():
+        logger.info("Scrape running, maintenance skipped")
+        return
+    deleted = await expire_old_offers(EXPIRE_MAX_BATCHES)
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, purge_media_jobs, JOB_RETENTION_SECONDS)
+    await loop.run_in_executor(None, incremental_vacuum, VACUUM_PAGES_PER_RUN)
+    if deleted:
+        logger.info(f"Expired {deleted} old offers")
+
+
 async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """إحصائيات البوت"""
     stats = get_stats()
@@ -107,9 +156,9 @@ async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 async def clear_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """مسح العروض القديمة"""
-    clear_database()
-    await update.message.reply_text(MESSAGES["cleared"])
+    """مسح العروض القديمة (حسب العمر - سجل التكرار يبقى)"""
+    deleted = await expire_old_offers()
+    await update.message.reply_text(f"{MESSAGES['cleared']} ({deleted})")
 
 
 async def add_offer_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -182,29 +231,48 @@ def format_caption(offer: dict) -> str:
     return msg
 
 
-async def send_offer_to_chat(bot, chat_id, offer: dict):
-    """إرسال العرض مع صورة مصممة"""
-    caption = format_caption(offer)
-    
-    # Generate custom image
-    image_io = create_offer_image(
+def render_offer_image(offer: dict):
+    """تصميم صورة العرض (عملية ثقيلة - تُشغّل في thread منفصل عند النشر)"""
+    return create_offer_image(
         offer.get('image_url'), 
         offer.get('title'), 
         offer.get('price'), 
         offer.get('source')
     )
+
+
+async def send_offer_to_chat(bot, chat_id, offer: dict, image_io=None, render=True) -> bool:
+    """إرسال العرض مع صورة مصممة - يرجع True إذا تم الإرسال"""
+    caption = format_caption(offer)
+    sender = get_sender()
+    
+    # Generate custom image (إلا إذا صُمّمت مسبقاً)
+    if render:
+        image_io = render_offer_image(offer)
     
     try:
         if image_io:
-            await bot.send_photo(chat_id=chat_id, photo=image_io, caption=caption, parse_mode='Markdown')
+            # bytes بدل BytesIO حتى تعمل إعادة المحاولة بعد RetryAfter
+            await sender.send(chat_id, bot.send_photo, photo=image_io.getvalue(), caption=caption, parse_mode='Markdown')
         elif offer.get('image_url'):
-            await bot.send_photo(chat_id=chat_id, photo=offer['image_url'], caption=caption, parse_mode='Markdown')
+            await sender.send(chat_id, bot.send_photo, photo=offer['image_url'], caption=caption, parse_mode='Markdown')
         else:
-            await bot.send_message(chat_id=chat_id, text=caption, parse_mode='Markdown')
+            await sender.send(chat_id, bot.send_message, text=caption, parse_mode='Markdown')
+        return True
+    except RetryAfter as e:
+        # لا فائدة من رسالة بديلة أثناء حظر الإرسال - يبقى العرض غير منشور للمرة القادمة
+        logger.error(f"Send skipped, flood limit: {e}")
+        return False
     except Exception as e:
         logger.error(f"Send error: {e}")
-        # Fallback
-        await bot.send_message(chat_id=chat_id, text=caption, parse_mode='Markdown')
+    
+    # Fallback
+    try:
+        await sender.send(chat_id, bot.send_message, text=caption, parse_mode='Markdown')
+        return True
+    except Exception as e:
+        logger.error(f"Fallback send error: {e}")
+        return False
 
 
 async def send_offer_message(message_object, offer: dict):
@@ -221,69 +289,101 @@ async def send_offer_message(message_object, offer: dict):
 
 
 async def post_to_channel(app: Application):
-    """نشر العروض للقناة"""
-    offers = get_unsent_offers(5)
-    for offer in offers:
-        await send_offer_to_chat(app.bot, CHANNEL_ID, dict(offer))
-        mark_as_sent(offer['link'])
+    """نشر العروض للقناة - تصميم الصورة التالية أثناء إرسال الحالية"""
+    offers = [dict(offer) for offer in get_unsent_offers(5)]
+    if not offers:
+        return
+    
+    loop = asyncio.get_running_loop()
+    rendered = asyncio.Queue(maxsize=SEND_PIPELINE_DEPTH)
+    
+    async def render_all():
+        for offer in offers:
+            try:
+                image_io = await loop.run_in_executor(None, render_offer_image, offer)
+            except Exception as e:
+                # بدون صورة مصممة - send_offer_to_chat يرسل صورة العرض الأصلية، والمستهلك لا يتوقف
+                logger.error(f"Render error: {e}")
+                image_io = None
+            await rendered.put((offer, image_io))
+        await rendered.put(None)
+    
+    renderer = asyncio.create_task(render_all())
+    sent_links = []
+    try:
+        while (item := await rendered.get()) is not None:
+            offer, image_io = item
+            if await send_offer_to_chat(app.bot, CHANNEL_ID, offer, image_io, render=False):
+                sent_links.append(offer['link'])
+    finally:
+        renderer.cancel()
+        # تحديث كل العروض المنشورة في معاملة واحدة
+        mark_many_as_sent(sent_links)
 
 
+@timed(HANDLER_SECONDS, handler='handle_photo')
 async def handle_photo(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """معالجة الصور - إزالة الخلفية/العلامات/الكتابة/الإطار"""
-    caption = (update.message.caption or "").lower().strip()
-    
-    # تحديد نوع المعالجة من التعليق
-    if any(x in caption for x in ['علامة', 'ووتر', 'watermark', 'شعار', 'لوقو']):
-        mode = 'watermark'
-        msg = "🔄 جاري إزالة العلامة المائية..."
-    elif any(x in caption for x in ['كتابة', 'نص', 'text', 'كلام']):
-        mode = 'text'
-        msg = "🔄 جاري إزالة الكتابة..."
-    elif any(x in caption for x in ['قص', 'اطار', 'crop', 'frame', 'شريط']):
-        mode = 'crop'
-        msg = "🔄 جاري قص الإطار..."
+    # تحديد العمليات من التعليق (يمكن ربط أكثر من عملية)
+    modes = detect_image_modes(update.message.caption)
+    await update.message.reply_text(image_start_message(modes))
+
+    # أصغر دقة تكفي العمليات (إزالة الخلفية لا تحتاج 2560px)
+    file_id = pick_photo_size(update.message.photo, modes).file_id
+    if MEDIA_QUEUE:
+        await queue_media_job(update, 'image', {'modes': modes, 'file_id': file_id})
     else:
-        mode = 'background'
-        msg = "🔄 جاري إزالة الخلفية..."
+        await run_image_job(context.bot, update.effective_chat.id, modes, file_id)
+
+
+@timed(HANDLER_SECONDS, handler='handle_document')
+async def handle_document(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """صور مرسلة كملف (بدون ضغط تيليجرام) - نفس عمليات handle_photo"""
+    document = update.message.document
+    # الحجم معروف من الرسالة - لا تحميل لملف لن يُعالج
+    if document.file_size and document.file_size > DOCUMENT_MAX_BYTES:
+        await update.message.reply_text(f"❌ الملف كبير جداً - الحد {DOCUMENT_MAX_BYTES // (1024 * 1024)}MB")
+        return
     
-    await update.message.reply_text(msg)
+    modes = detect_image_modes(update.message.caption)
+    # رسالة الحالة تُعدَّل بنسبة تحميل الملف ثم تُحذف عند الانتهاء
+    status = await update.message.reply_text(image_start_message(modes))
+    if MEDIA_QUEUE:
+        payload = {'modes': modes, 'file_id': document.file_id, 'document': True, 'status_message_id': status.message_id}
+        await queue_media_job(update, 'image', payload, status)
+    else:
+        await run_image_job(context.bot, update.effective_chat.id, modes, document.file_id, document=True,
+                            status_message_id=status.message_id)
+
+
+async def queue_media_job(update: Update, kind: str, payload: dict, status=None):
+    """إضافة المهمة لطابور العمال وإبلاغ المستخدم بترتيبه
     
+    status: رسالة الحالة - يُضاف لها الترتيب بدل رسالة جديدة
+    """
+    loop = asyncio.get_running_loop()
     try:
-        photo = update.message.photo[-1]
-        file = await context.bot.get_file(photo.file_id)
-        photo_bytes = await file.download_as_bytearray()
-        
-        # تطبيق المعالجة المناسبة
-        if mode == 'watermark':
-            result = await remove_watermark(bytes(photo_bytes))
-            filename = "no_watermark.png"
-            success_msg = "✅ تم إزالة العلامة المائية!"
-        elif mode == 'text':
-            result = await remove_text_from_image(bytes(photo_bytes))
-            filename = "no_text.png"
-            success_msg = "✅ تم إزالة الكتابة!"
-        elif mode == 'crop':
-            result = await crop_phone_frame(bytes(photo_bytes))
-            filename = "cropped.png"
-            success_msg = "✅ تم قص الإطار!"
-        else:
-            result = await remove_background(bytes(photo_bytes))
-            filename = "no_background.png"
-            success_msg = "✅ تم إزالة الخلفية!"
-        
-        if result:
-            await update.message.reply_document(
-                document=result,
-                filename=filename,
-                caption=success_msg
-            )
-        else:
-            await update.message.reply_text("❌ فشلت العملية - جرب صورة أخرى")
+        job_id, position = await loop.run_in_executor(
+            None, enqueue_media_job, kind, update.effective_chat.id, payload
+        )
     except Exception as e:
-        logger.error(f"Photo error: {e}")
+        logger.error(f"Queue error: {e}")
         await update.message.reply_text("❌ حدث خطأ")
+        return
+    if position <= 1:
+        return
+    if not status:
+        await update.message.reply_text(f"⏳ ترتيبك في الطابور: {position}")
+        return
+    # المهمة في الطابور بالفعل - فشل التعديل لا يعني فشلها، والعامل الذي حجزها يملك الرسالة
+    try:
+        if await loop.run_in_executor(None, is_media_job_queued, job_id):
+            await status.edit_text(f"{status.text}\n⏳ ترتيبك في الطابور: {position}")
+    except TelegramError as e:
+        logger.warning(f"Queue position edit failed: {e}")
 
 
+@timed(HANDLER_SECONDS, handler='handle_text')
 async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """معالجة الأوامر النصية والروابط"""
     text = update.message.text
@@ -296,25 +396,15 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if urls:
         url = urls[0]
         if is_supported_url(url):
-            await update.message.reply_text("📥 جاري التحميل...")
-            try:
-                result = await download_video(url)
-                if result:
-                    if result['type'] == 'video':
-                        await update.message.reply_video(
-                            video=result['file'],
-                            caption="✅ تم التحميل بدون علامة مائية!"
-                        )
-                    else:
-                        await update.message.reply_photo(
-                            photo=result['file'],
-                            caption="✅ تم التحميل!"
-                        )
+            with span('handle_text') as s:
+                # رسالة حالة واحدة: الترتيب في الطابور، نسبة التحميل، ثم الإرسال
+                status = await update.message.reply_text("📥 جاري التحميل...")
+                if MEDIA_QUEUE:
+                    # العامل يكمل نفس الرحلة
+                    payload = {'url': url, 'trace_id': s.trace_id, 'status_message_id': status.message_id}
+                    await queue_media_job(update, 'download', payload, status)
                 else:
-                    await update.message.reply_text("❌ فشل التحميل - جرب مرة ثانية")
-            except Exception as e:
-                logger.error(f"Download error: {e}")
-                await update.message.reply_text("❌ حدث خطأ في التحميل")
+                    await run_download_job(context.bot, update.effective_chat.id, url, status.message_id)
             return
     
     # الأوامر النصية العادية
@@ -324,39 +414,55 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if t in ['عروض', 'latest']: await offers_command(update, context)
     elif t in ['تحديث', 'refresh']: await refresh_command(update, context)
     elif t in ['مسح', 'clear']: await clear_command(update, context)
+    elif t in ['احصائيات', 'stats']: await stats_command(update, context)
     elif t.startswith('اضافة') or t.startswith('add'): await add_offer_command(update, context)
     elif t in ['مساعدة', 'help', 'start']: await start_command(update, context)
 
 
-def main():
-    print("🚀 Bot Starting...")
-    init_db()
-    app = Application.builder().token(BOT_TOKEN).build()
-    
-    # Handlers
+def add_handlers(app: Application):
+    """تسجيل معالجات الرسائل (مشتركة بين التشغيل واختبار الحمل)"""
     app.add_handler(CommandHandler("start", start_command))
     
     # --- DEBUG & ADMIN ---
     app.add_handler(CommandHandler("debug", debug_command))
     
-    # FORCE CLEAR ON STARTUP (Fix for "Nothing Changed")
-    # This ensures we start fresh every restart
-    clear_database()
-    print("🧹 Database force cleared on startup.")
-    
     # Media Tools Handlers
     app.add_handler(MessageHandler(filters.PHOTO, handle_photo))
+    app.add_handler(MessageHandler(filters.Document.IMAGE, handle_document))
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_text))
+
+
+def main():
+    print("🚀 Bot Starting...")
+    init_db()
+    webhook_mode = BOT_MODE == "webhook"
+    # محادثات مختلفة بالتوازي، ونفس المحادثة بالترتيب
+    builder = Application.builder().token(BOT_TOKEN).concurrent_updates(ChatOrderedUpdateProcessor(UPDATE_CONCURRENCY))
+    if webhook_mode:
+        # التحديثات تصل من خادم webhook وليس من Updater
+        builder = builder.updater(None)
+    else:
+        from webhook import health_server_hooks
+        post_init, post_shutdown = health_server_hooks("0.0.0.0", PORT)
+        builder = builder.post_init(post_init).post_shutdown(post_shutdown)
+    app = builder.build()
+    add_handlers(app)
     
     # Job Queue (Automation)
     if app.job_queue:
         # Run every 30 minutes (1800 seconds)
         app.job_queue.run_repeating(scheduled_scrape_job, interval=1800, first=60)
+        # الصيانة بين عمليات السحب
+        app.job_queue.run_repeating(maintenance_job, interval=MAINTENANCE_INTERVAL, first=900)
         print("✅ Automation scheduled (every 30 mins)")
     else:
         print("⚠️ JobQueue not available")
-        
-    app.run_polling()
+    
+    if webhook_mode:
+        from webhook import run_webhook
+        asyncio.run(run_webhook(app, "0.0.0.0", PORT, WEBHOOK_URL, WEBHOOK_SECRET or None))
+    else:
+        app.run_polling()
 
 
 if __name__ == "__main__":
@@ -8,15 +8,109 @@ CHANNEL_ID = os.environ.get("CHANNEL_ID", "@QQXQQ8")
 # Admin user IDs
 ADMIN_IDS = []
 
+# ===== WEBHOOK SETTINGS =====
+# BOT_MODE=webhook يشغل خادم HTTP على PORT بدل long polling
+# (تلقائي على Railway إذا كان للخدمة رابط عام)
+RAILWAY_PUBLIC_DOMAIN = os.environ.get("RAILWAY_PUBLIC_DOMAIN", "")
+WEBHOOK_URL = os.environ.get("WEBHOOK_URL", f"https://{RAILWAY_PUBLIC_DOMAIN}" if RAILWAY_PUBLIC_DOMAIN else "")
+BOT_MODE = os.environ.get("BOT_MODE", "webhook" if WEBHOOK_URL else "polling")
+WEBHOOK_SECRET = os.environ.get("WEBHOOK_SECRET", "")
+PORT = int(os.environ.get("PORT", "8080"))
+# عدد التحديثات التي تُعالج في نفس الوقت (تحديثات نفس المحادثة تبقى بالترتيب)
+UPDATE_CONCURRENCY = int(os.environ.get("UPDATE_CONCURRENCY", "8"))
+
 # ===== SCRAPING SETTINGS =====
 SCRAPE_INTERVAL = 60
 
 # مصادر سعودية فقط - بدون أجنبي
 RSS_FEEDS = []  # فارغ - نستخدم المواقع السعودية فقط
 
+# صفحات العروض (HTML) - لكل موقع محدد CSS لبطاقات العروض في صفحته، يُتحقق منه على الموقع نفسه
+# مثال:
+# SITE_SOURCES = [
+#     {
+#         "name": "example",
+#         "label": "اسم المصدر",
+#         "urls": ["https://example.com/deals"],
+#         "category": "التصنيف",
+#         "selector": ".deal-card",
+#     },
+# ]
+SITE_SOURCES = []
+
+# المصادر تُسحب بالتوازي - مهلة كل مصدر كامل ومهلة كل طلب (بالثواني)
+SCRAPE_SOURCE_TIMEOUT = 45
+SCRAPE_REQUEST_TIMEOUT = 20
+SCRAPE_MAX_CONNECTIONS = 10
+SCRAPE_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36"
+
+# ===== SENDING SETTINGS =====
+# حدود تيليجرام: ~30 رسالة/ثانية للبوت، ~20 رسالة/دقيقة للقناة الواحدة
+SEND_GLOBAL_PER_SECOND = 30
+SEND_CHAT_INTERVAL = 3.0
+SEND_MAX_RETRIES = 3
+# عدد الصور المصممة مسبقاً أثناء انتظار الإرسال
+SEND_PIPELINE_DEPTH = 2
+
 # ===== DATABASE =====
 DATABASE_FILE = "offers.db"
 
+# ===== MAINTENANCE =====
+# العروض الأقدم من هذه المدة تُحذف تدريجياً (على دفعات صغيرة بين عمليات السحب)
+OFFER_MAX_AGE_DAYS = 30
+EXPIRE_BATCH_SIZE = 500
+EXPIRE_MAX_BATCHES = 20
+VACUUM_PAGES_PER_RUN = 1000
+MAINTENANCE_INTERVAL = 3600
+
+# ===== MEDIA JOB QUEUE =====
+# عند التفعيل البوت يضيف مهام الوسائط لطابور SQLite وتنفذها عمليات worker.py
+MEDIA_QUEUE = os.environ.get("MEDIA_QUEUE", "").lower() in ("1", "true", "yes")
+WORKER_CONCURRENCY = int(os.environ.get("WORKER_CONCURRENCY", "2"))
+WORKER_POLL_INTERVAL = 1.0
+# مهمة "running" أقدم من هذا = عامل توقف، تعود للطابور
+JOB_STALE_TIMEOUT = 600
+JOB_MAX_ATTEMPTS = 2
+# المهام المنتهية تُحذف بعد يوم
+JOB_RETENTION_SECONDS = 86400
+# منفذ /metrics لعملية worker.py (0 = بدون خادم)
+WORKER_METRICS_PORT = int(os.environ.get("WORKER_METRICS_PORT", "0"))
+
+# ===== IMAGE TOOLS =====
+# أقصى ضلع لدقة العمل في إزالة العلامات/الكتابة (0 = الدقة الكاملة)
+IMAGE_WORK_MAX_SIDE = int(os.environ.get("IMAGE_WORK_MAX_SIDE", "1024"))
+# القناع الأكبر من هذا (بكسل) يُقسم لمناطق تُعالج بالتوازي
+INPAINT_REGION_MIN_PIXELS = 20000
+INPAINT_MAX_COMPONENTS = 64
+INPAINT_TILE_SIZE = 256
+# صيغة ناتج كل عملية: png / webp (بدون فقد) / jpeg (تصبح png إذا كان في الصورة شفافية)
+# مثال: IMAGE_OUTPUT_FORMATS="crop=jpeg,background=png"
+IMAGE_OUTPUT_FORMATS = {
+    'crop': 'png', 'watermark': 'png', 'text': 'png', 'background': 'webp',
+    **dict(item.split('=', 1) for item in os.environ.get("IMAGE_OUTPUT_FORMATS", "").split(',') if '=' in item),
+}
+# ضغط PNG من 0 إلى 9 (الافتراضي في OpenCV = 3) - 1 أسرع بكثير وبحجم أكبر قليلاً
+PNG_COMPRESSION = int(os.environ.get("PNG_COMPRESSION", "1"))
+JPEG_QUALITY = int(os.environ.get("JPEG_QUALITY", "92"))
+# دقة الصورة المحمّلة لإزالة الخلفية (الضلع الأطول) - Rembg يعمل على 320px والناتج بدقة الإدخال
+BACKGROUND_INPUT_SIDE = int(os.environ.get("BACKGROUND_INPUT_SIDE", "1280"))
+# صور مرسلة كملف (بدون ضغط تيليجرام) - حد getFile في Bot API السحابي 20MB
+DOCUMENT_MAX_BYTES = int(os.environ.get("DOCUMENT_MAX_BYTES", str(20 * 1024 * 1024)))
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+# أقل مدة (ثانية) بين تعديلات رسالة التقدم لنفس المهمة
+PROGRESS_EDIT_INTERVAL = 3.0
+# أقصى ضلع بعد فك الترميز - JPEG يُصغَّر أثناء فك الترميز نفسه بدون تحميل الصورة كاملة
+IMAGE_MAX_SIDE = int(os.environ.get("IMAGE_MAX_SIDE", "4096"))
+# الصيغ الأخرى تُفك كاملة قبل التصغير - الأكبر من هذا (بكسل) تُرفض
+IMAGE_MAX_PIXELS = 40_000_000
+
+# ===== TRACING =====
+# ملف JSON lines لمراحل كل طلب تحميل (فارغ = إيقاف، الافتراضي) - التحليل: python tracing.py
+TRACE_FILE = os.environ.get("TRACE_FILE", "")
+# الملف يُدوَّر عند هذا الحجم مع عدد محدود من النسخ القديمة
+TRACE_FILE_MAX_BYTES = int(os.environ.get("TRACE_FILE_MAX_BYTES", str(20 * 1024 * 1024)))
+TRACE_FILE_BACKUPS = 2
+
 # ===== ARABIC MESSAGES =====
 MESSAGES = {
     "welcome": """
@@ -1,14 +1,33 @@
 import sqlite3
 import os
+import json
+import time
+import hashlib
+import functools
+from datetime import datetime
+
+from metrics import timed, DB_SECONDS, CACHE_REQUESTS
 
 DATABASE_FILE = "offers.db"
+# القاعدة مشتركة بين البوت وعمليات worker.py - كل اتصال ينتظر القفل بدل "database is locked"
+DB_BUSY_TIMEOUT = 30
 
+# روابط العروض المحفوظة + بصمات روابط العروض المنتهية
+# (تُحمّل مرة واحدة لتصفية المكرر قبل الكتابة)
+_known_links = None
+_expired_hashes = None
 
-def init_db():
-    conn = sqlite3.connect(DATABASE_FILE)
-    c = conn.cursor()
-    
-    # Create table with new schema
+
+# ===== MIGRATIONS =====
+# كل ترحيل يُطبّق مرة واحدة وبالترتيب - رقم الإصدار محفوظ في PRAGMA user_version
+
+def _columns(c, table):
+    c.execute(f"PRAGMA table_info({table})")
+    return {row[1] for row in c.fetchall()}
+
+
+def _migrate_base_schema(c):
+    """الجداول الأساسية (كما كانت قبل نظام الترحيل)"""
     c.execute("""
         CREATE TABLE IF NOT EXISTS offers (
             id INTEGER PRIMARY KEY,
@@ -23,75 +42,489 @@ def init_db():
         )
     """)
     
-    # Attempt to add new columns if they don't exist (migrations)
-    try:
-        c.execute("ALTER TABLE offers ADD COLUMN image_url TEXT")
-    except:
-        pass
-        
-    try:
-        c.execute("ALTER TABLE offers ADD COLUMN description TEXT")
-    except:
-        pass
-        
-    conn.commit()
+    # حالة آخر سحب لكل رابط مصدر (للطلبات الشرطية)
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS source_cache (
+            url TEXT PRIMARY KEY,
+            etag TEXT,
+            last_modified TEXT,
+            content_hash TEXT,
+            checked_at TEXT
+        )
+    """)
+    
+    # قواعد قديمة قبل إضافة هذه الأعمدة
+    columns = _columns(c, "offers")
+    for column in ("image_url", "description"):
+        if column not in columns:
+            c.execute(f"ALTER TABLE offers ADD COLUMN {column} TEXT")
+
+
+def _migrate_indexes(c):
+    """فهرس جزئي للعروض غير المنشورة (صغير مهما كبر الجدول)"""
+    c.execute("CREATE INDEX IF NOT EXISTS idx_offers_unsent ON offers(id) WHERE is_sent = 0")
+
+
+def _migrate_offer_expiry(c):
+    """تاريخ إضافة العرض (للحذف حسب العمر) + بصمات الروابط المحذوفة لمنع إعادة نشرها"""
+    c.execute("ALTER TABLE offers ADD COLUMN created_at INTEGER")
+    # العروض الموجودة تبدأ عمرها من الآن
+    c.execute("UPDATE offers SET created_at = ?", (int(time.time()),))
+    c.execute("CREATE INDEX IF NOT EXISTS idx_offers_created_at ON offers(created_at)")
+    c.execute("CREATE TABLE IF NOT EXISTS expired_links (link_hash INTEGER PRIMARY KEY, expired_at INTEGER)")
+
+
+def _migrate_media_jobs(c):
+    """طابور مهام الوسائط المشترك بين البوت وعمليات worker.py"""
+    c.execute("""
+        CREATE TABLE media_jobs (
+            id INTEGER PRIMARY KEY,
+            kind TEXT NOT NULL,
+            chat_id INTEGER NOT NULL,
+            payload TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            worker TEXT,
+            created_at INTEGER,
+            started_at INTEGER,
+            finished_at INTEGER
+        )
+    """)
+    c.execute("CREATE INDEX idx_media_jobs_queued ON media_jobs(id) WHERE status = 'queued'")
+    c.execute("CREATE INDEX idx_media_jobs_running ON media_jobs(started_at) WHERE status = 'running'")
+
+
+def _migrate_stats_counters(c):
+    """عدادات العروض تُحدَّث بالـ triggers - الإحصائيات لا تمسح جدول العروض"""
+    c.execute("CREATE TABLE stats_counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL DEFAULT 0)")
+    # تعبئة أولية من البيانات الحالية
+    c.execute("""
+        INSERT INTO stats_counters (name, value)
+        SELECT 'offers_total', COUNT(*) FROM offers
+        UNION ALL SELECT 'offers_sent', COALESCE(SUM(is_sent), 0) FROM offers
+    """)
+    c.execute("""
+        CREATE TRIGGER offers_counters_insert AFTER INSERT ON offers BEGIN
+            UPDATE stats_counters SET value = value + 1 WHERE name = 'offers_total';
+            UPDATE stats_counters SET value = value + COALESCE(NEW.is_sent, 0) WHERE name = 'offers_sent';
+        END
+    """)
+    c.execute("""
+        CREATE TRIGGER offers_counters_delete AFTER DELETE ON offers BEGIN
+            UPDATE stats_counters SET value = value - 1 WHERE name = 'offers_total';
+            UPDATE stats_counters SET value = value - COALESCE(OLD.is_sent, 0) WHERE name = 'offers_sent';
+        END
+    """)
+    c.execute("""
+        CREATE TRIGGER offers_counters_sent AFTER UPDATE OF is_sent ON offers BEGIN
+            UPDATE stats_counters SET value = value + COALESCE(NEW.is_sent, 0) - COALESCE(OLD.is_sent, 0)
+            WHERE name = 'offers_sent';
+        END
+    """)
+
+
+def _migrate_auto_vacuum(c):
+    """الصفحات الفارغة تُعاد للنظام تدريجياً بـ incremental_vacuum
+
+    تغيير auto_vacuum لقاعدة فيها جداول يحتاج VACUUM، وهو لا يعمل داخل معاملة - يُرجَع ليُنفَّذ
+    بعد تسجيل الإصدار، فتصل إليه عملية واحدة فقط.
+    """
+    if c.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+        return None
+    c.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    return "VACUUM"
+
+
+MIGRATIONS = [
+    (1, _migrate_base_schema),
+    (2, _migrate_indexes),
+    (3, _migrate_offer_expiry),
+    (4, _migrate_media_jobs),
+    (5, _migrate_stats_counters),
+    (6, _migrate_auto_vacuum),
+]
+
+
+def migrate(conn):
+    """تطبيق الترحيلات الناقصة - كل ترحيل في معاملة مستقلة
+
+    الترحيل قد يرجع أمراً يُنفَّذ بعد COMMIT (مثل VACUUM)
+    """
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for target, migration in MIGRATIONS:
+        if target <= version:
+            continue
+        c = conn.cursor()
+        c.execute("BEGIN IMMEDIATE")
+        try:
+            # عملية أخرى (web و worker عند نفس التشغيل) ربما طبقت الترحيل قبل أن نأخذ القفل
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if target <= version:
+                c.execute("ROLLBACK")
+                continue
+            after_commit = migration(c)
+            c.execute(f"PRAGMA user_version = {target}")
+            c.execute("COMMIT")
+        except Exception:
+            c.execute("ROLLBACK")
+            raise
+        if after_commit:
+            try:
+                c.execute(after_commit)
+            except sqlite3.OperationalError as e:
+                # الإصدار مسجل بالفعل - لا نوقف التشغيل من أجل خطوة صيانة
+                print(f"Migration v{target} step '{after_commit}' failed: {e}")
+        print(f"Database migrated to v{target}")
+        version = target
+    return version
+
+
+def init_db():
+    conn = sqlite3.connect(DATABASE_FILE, isolation_level=None, timeout=DB_BUSY_TIMEOUT)
+    # WAL: القراءة (العروض، الإحصائيات، /metrics) لا تنتظر الكتابة - الإعداد محفوظ في ملف القاعدة
+    if conn.execute("PRAGMA journal_mode").fetchone()[0] != 'wal':
+        conn.execute("PRAGMA journal_mode = WAL")
+    migrate(conn)
     conn.close()
     print("Database ready")
 
 
+@timed(DB_SECONDS, op='save_offer')
 def save_offer(title, link, price=None, category=None, source=None, image_url=None, description=None):
     if not link:
         return False
     try:
-        conn = sqlite3.connect(DATABASE_FILE)
+        conn = sqlite3.connect(DATABASE_FILE, timeout=DB_BUSY_TIMEOUT)
         c = conn.cursor()
         c.execute("""
             INSERT OR IGNORE INTO offers 
-            (title, link, price, category, source, image_url, description) 
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (title, link, price, category, source, image_url, description))
+            (title, link, price, category, source, image_url, description, created_at) 
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, (title, link, price, category, source, image_url, description, int(time.time())))
         conn.commit()
         inserted = c.rowcount > 0
         conn.close()
+        if _known_links is not None:
+            _known_links.add(link)
         return inserted
     except Exception as e:
         print(f"Error saving offer: {e}")
         return False
 
 
+def link_hash(link):
+    """بصمة 64-bit للرابط (تُحفظ بدل الرابط بعد حذف العرض)"""
+    return int.from_bytes(hashlib.blake2b(link.encode(), digest_size=8).digest(), 'big', signed=True)
+
+
+def _get_dedup_state(c):
+    global _known_links, _expired_hashes
+    if _known_links is None:
+        c.execute("SELECT link FROM offers")
+        _known_links = {row[0] for row in c.fetchall()}
+    if _expired_hashes is None:
+        c.execute("SELECT link_hash FROM expired_links")
+        _expired_hashes = {row[0] for row in c.fetchall()}
+    return _known_links, _expired_hashes
+
+
+@timed(DB_SECONDS, op='save_offers')
+def save_offers(offers):
+    """حفظ دفعة عروض في معاملة واحدة - يرجع العروض الجديدة فقط (None عند الفشل)"""
+    conn = sqlite3.connect(DATABASE_FILE, isolation_level=None, timeout=DB_BUSY_TIMEOUT)
+    c = conn.cursor()
+    try:
+        known, expired = _get_dedup_state(c)
+        
+        # تصفية المكرر في الذاكرة (داخل الدفعة ومع قاعدة البيانات والعروض المنتهية)
+        candidates = {}
+        for offer in offers:
+            link = offer.get('link')
+            if link and link not in known and link not in candidates and link_hash(link) not in expired:
+                candidates[link] = offer
+        CACHE_REQUESTS.inc(len(offers) - len(candidates), cache='offer_dedup', result='hit')
+        CACHE_REQUESTS.inc(len(candidates), cache='offer_dedup', result='miss')
+        if not candidates:
+            return []
+        
+        c.execute("BEGIN IMMEDIATE")
+        # التأكد من القاعدة نفسها (قد يكون عرض أُضيف من مكان آخر) - القفل يضمن دقة النتيجة
+        links = list(candidates)
+        for i in range(0, len(links), 500):
+            chunk = links[i:i + 500]
+            c.execute(f"SELECT link FROM offers WHERE link IN ({','.join('?' * len(chunk))})", chunk)
+            for (link,) in c.fetchall():
+                del candidates[link]
+        
+        new_offers = list(candidates.values())
+        now = int(time.time())
+        c.executemany("""
+            INSERT OR IGNORE INTO offers 
+            (title, link, price, category, source, image_url, description, created_at) 
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, [(o.get('title'), o['link'], o.get('price'), o.get('category'), o.get('source'), o.get('image_url'), o.get('description'), now)
+              for o in new_offers])
+        c.execute("COMMIT")
+        known.update(candidates)
+        return new_offers
+    except Exception as e:
+        if conn.in_transaction:
+            c.execute("ROLLBACK")
+        print(f"Error saving offers: {e}")
+        return None
+    finally:
+        conn.close()
+
+
+@timed(DB_SECONDS, op='get_source_cache')
+def get_source_cache(url):
+    """آخر ETag و Last-Modified وبصمة المحتوى لرابط مصدر"""
+    conn = sqlite3.connect(DATABASE_FILE, timeout=DB_BUSY_TIMEOUT)
+    conn.row_factory = sqlite3.Row
+    c = conn.cursor()
+    c.execute("SELECT etag, last_modified, content_hash FROM source_cache WHERE url = ?", (url,))
+    row = c.fetchone()
+    conn.close()
+    return dict(row) if row else None
+
+
+@timed(DB_SECONDS, op='save_source_cache')
+def save_source_cache(url, etag, last_modified, content_hash):
+    conn = sqlite3.connect(DATABASE_FILE, timeout=DB_BUSY_TIMEOUT)
+    c = conn.cursor()
+    c.execute("INSERT OR REPLACE INTO source_cache (url, etag, last_modified, content_hash, checked_at) VALUES (?, ?, ?, ?, ?)",
+        (url, etag, last_modified, content_hash, datetime.now().isoformat()))
+    conn.commit()
+    conn.close()
+
+
+@timed(DB_SECONDS, op='get_unsent_offers')
 def get_unsent_offers(limit=10):
-    conn = sqlite3.connect(DATABASE_FILE)
+    conn = sqlite3.connect(DATABASE_FILE, timeout=DB_BUSY_TIMEOUT)
     conn.row_factory = sqlite3.Row
     c = conn.cursor()
-    c.execute("SELECT * FROM offers WHERE is_sent = 0 LIMIT ?", (limit,))
+    c.execute("SELECT * FROM offers WHERE is_sent = 0 ORDER BY id LIMIT ?", (limit,))
     rows = c.fetchall()
     conn.close()
     return rows
 
 
+@timed(DB_SECONDS, op='mark_as_sent')
 def mark_as_sent(link):
-    conn = sqlite3.connect(DATABASE_FILE)
+    conn = sqlite3.connect(DATABASE_FILE, timeout=DB_BUSY_TIMEOUT)
     c = conn.cursor()
     c.execute("UPDATE offers SET is_sent = 1 WHERE link = ?", (link,))
     conn.commit()
     conn.close()
 
 
+@timed(DB_SECONDS, op='mark_many_as_sent')
+def mark_many_as_sent(links):
+    """تعليم عدة عروض كمنشورة في معاملة واحدة"""
+    if not links:
+        return
+    conn = sqlite3.connect(DATABASE_FILE, timeout=DB_BUSY_TIMEOUT)
+    c = conn.cursor()
+    c.executemany("UPDATE offers SET is_sent = 1 WHERE link = ?", [(link,) for link in links])
+    conn.commit()
+    conn.close()
+
+
+# ===== STATS CACHE =====
+# نتائج الإحصائيات تُحفظ لثوانٍ قليلة (أوامر الإحصائيات المتكررة لا تلمس القاعدة)
+STATS_CACHE_TTL = 10
+_stats_cache = {}
+
+
+def _cached_stats(func):
+    @functools.wraps(func)
+    def wrapper():
+        now = time.monotonic()
+        hit = _stats_cache.get(func.__name__)
+        if hit and now - hit[0] < STATS_CACHE_TTL:
+            return hit[1]
+        result = func()
+        _stats_cache[func.__name__] = (now, result)
+        return result
+    return wrapper
+
+
+def _read_counters(c, *names):
+    c.execute(f"SELECT name, value FROM stats_counters WHERE name IN ({','.join('?' * len(names))})", names)
+    values = dict(c.fetchall())
+    return [values.get(name, 0) for name in names]
+
+
+@_cached_stats
+@timed(DB_SECONDS, op='get_stats')
 def get_stats():
-    conn = sqlite3.connect(DATABASE_FILE)
+    conn = sqlite3.connect(DATABASE_FILE, timeout=DB_BUSY_TIMEOUT)
     c = conn.cursor()
-    c.execute("SELECT COUNT(*) FROM offers")
-    total = c.fetchone()[0]
-    c.execute("SELECT COUNT(*) FROM offers WHERE is_sent = 1")
-    sent = c.fetchone()[0]
+    total, sent = _read_counters(c, 'offers_total', 'offers_sent')
     conn.close()
     return {"total": total, "sent": sent, "pending": total - sent}
 
 
+@timed(DB_SECONDS, op='expire_offers_batch')
+def expire_offers_batch(max_age_days, batch_size=500):
+    """حذف دفعة واحدة من العروض الأقدم من max_age_days - يرجع عدد المحذوف
+
+    الروابط المحذوفة تبقى كبصمات في expired_links حتى لا يُعاد سحبها ونشرها.
+    """
+    cutoff = int(time.time()) - max_age_days * 86400
+    conn = sqlite3.connect(DATABASE_FILE, isolation_level=None, timeout=DB_BUSY_TIMEOUT)
+    c = conn.cursor()
+    try:
+        c.execute("BEGIN IMMEDIATE")
+        c.execute("SELECT id, link FROM offers WHERE created_at < ? ORDER BY created_at LIMIT ?", (cutoff, batch_size))
+        rows = c.fetchall()
+        hashes = [link_hash(link) for _, link in rows]
+        now = int(time.time())
+        c.executemany("INSERT OR IGNORE INTO expired_links (link_hash, expired_at) VALUES (?, ?)", [(h, now) for h in hashes])
+        c.executemany("DELETE FROM offers WHERE id = ?", [(offer_id,) for offer_id, _ in rows])
+        c.execute("COMMIT")
+    except Exception as e:
+        if conn.in_transaction:
+            c.execute("ROLLBACK")
+        print(f"Error expiring offers: {e}")
+        return 0
+    finally:
+        conn.close()
+    
+    if _known_links is not None:
+        _known_links.difference_update(link for _, link in rows)
+    if _expired_hashes is not None:
+        _expired_hashes.update(hashes)
+    return len(rows)
+
+
+@timed(DB_SECONDS, op='incremental_vacuum')
+def incremental_vacuum(pages):
+    """إعادة عدد محدود من الصفحات الفارغة للنظام (لا يقفل القاعدة طويلاً مثل VACUUM)"""
+    conn = sqlite3.connect(DATABASE_FILE, isolation_level=None, timeout=DB_BUSY_TIMEOUT)
+    conn.execute(f"PRAGMA incremental_vacuum({int(pages)})").fetchall()
+    conn.close()
+
+
+# ===== MEDIA JOB QUEUE =====
+
+@timed(DB_SECONDS, op='enqueue_media_job')
+def enqueue_media_job(kind, chat_id, payload):
+    """إضافة مهمة للطابور - يرجع (رقم المهمة، ترتيبها في الطابور)"""
+    conn = sqlite3.connect(DATABASE_FILE, timeout=DB_BUSY_TIMEOUT)
+    c = conn.cursor()
+    c.execute("INSERT INTO media_jobs (kind, chat_id, payload, created_at) VALUES (?, ?, ?, ?)",
+        (kind, chat_id, json.dumps(payload), int(time.time())))
+    job_id = c.lastrowid
+    conn.commit()
+    c.execute("SELECT COUNT(*) FROM media_jobs WHERE status = 'queued' AND id <= ?", (job_id,))
+    position = c.fetchone()[0]
+    conn.close()
+    return job_id, position
+
+
+@timed(DB_SECONDS, op='is_media_job_queued')
+def is_media_job_queued(job_id):
+    """هل المهمة ما زالت تنتظر (لم يحجزها عامل بعد)"""
+    conn = sqlite3.connect(DATABASE_FILE, timeout=DB_BUSY_TIMEOUT)
+    c = conn.cursor()
+    c.execute("SELECT 1 FROM media_jobs WHERE id = ? AND status = 'queued'", (job_id,))
+    queued = c.fetchone() is not None
+    conn.close()
+    return queued
+
+
+@timed(DB_SECONDS, op='claim_media_job')
+def claim_media_job(worker):
+    """حجز أقدم مهمة منتظرة لهذا العامل - None إذا الطابور فارغ"""
+    conn = sqlite3.connect(DATABASE_FILE, isolation_level=None, timeout=DB_BUSY_TIMEOUT)
+    conn.row_factory = sqlite3.Row
+    c = conn.cursor()
+    try:
+        # قراءة عادية أولاً - العامل الخامل لا يأخذ قفل الكتابة في كل دورة
+        c.execute("SELECT 1 FROM media_jobs WHERE status = 'queued' LIMIT 1")
+        if c.fetchone() is None:
+            return None
+        # القفل يمنع عاملين من حجز نفس المهمة
+        c.execute("BEGIN IMMEDIATE")
+        c.execute("SELECT * FROM media_jobs WHERE status = 'queued' ORDER BY id LIMIT 1")
+        row = c.fetchone()
+        if row is None:
+            c.execute("COMMIT")
+            return None
+        now = int(time.time())
+        c.execute("UPDATE media_jobs SET status = 'running', worker = ?, started_at = ?, attempts = attempts + 1 WHERE id = ?",
+            (worker, now, row['id']))
+        c.execute("COMMIT")
+        job = dict(row)
+        job.update(payload=json.loads(job['payload']), status='running', worker=worker, started_at=now,
+            attempts=job['attempts'] + 1)
+        return job
+    except Exception:
+        if conn.in_transaction:
+            c.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+
+@timed(DB_SECONDS, op='finish_media_job')
+def finish_media_job(job_id, success):
+    conn = sqlite3.connect(DATABASE_FILE, timeout=DB_BUSY_TIMEOUT)
+    c = conn.cursor()
+    c.execute("UPDATE media_jobs SET status = ?, finished_at = ? WHERE id = ?",
+        ('done' if success else 'failed', int(time.time()), job_id))
+    conn.commit()
+    conn.close()
+
+
+@timed(DB_SECONDS, op='requeue_stale_media_jobs')
+def requeue_stale_media_jobs(timeout, max_attempts):
+    """إعادة مهام عامل توقف في منتصفها - أو فشلها إذا تجاوزت عدد المحاولات"""
+    cutoff = int(time.time()) - timeout
+    conn = sqlite3.connect(DATABASE_FILE, timeout=DB_BUSY_TIMEOUT)
+    c = conn.cursor()
+    c.execute("UPDATE media_jobs SET status = 'failed', finished_at = ? WHERE status = 'running' AND started_at < ? AND attempts >= ?",
+        (int(time.time()), cutoff, max_attempts))
+    c.execute("UPDATE media_jobs SET status = 'queued', worker = NULL WHERE status = 'running' AND started_at < ?", (cutoff,))
+    requeued = c.rowcount
+    conn.commit()
+    conn.close()
+    return requeued
+
+
+@timed(DB_SECONDS, op='purge_media_jobs')
+def purge_media_jobs(max_age_seconds):
+    """حذف المهام المنتهية القديمة"""
+    conn = sqlite3.connect(DATABASE_FILE, timeout=DB_BUSY_TIMEOUT)
+    c = conn.cursor()
+    c.execute("DELETE FROM media_jobs WHERE status IN ('done', 'failed') AND finished_at < ?",
+        (int(time.time()) - max_age_seconds,))
+    deleted = c.rowcount
+    conn.commit()
+    conn.close()
+    return deleted
+
+
+@timed(DB_SECONDS, op='get_media_queue_depth')
+def get_media_queue_depth():
+    conn = sqlite3.connect(DATABASE_FILE, timeout=DB_BUSY_TIMEOUT)
+    c = conn.cursor()
+    c.execute("SELECT COUNT(*) FROM media_jobs WHERE status = 'queued'")
+    depth = c.fetchone()[0]
+    conn.close()
+    return depth
+
+
 def clear_database():
-    conn = sqlite3.connect(DATABASE_FILE)
+    """مسح كل العروض وسجل التكرار (للاستخدام اليدوي فقط)"""
+    global _known_links, _expired_hashes
+    conn = sqlite3.connect(DATABASE_FILE, timeout=DB_BUSY_TIMEOUT)
     c = conn.cursor()
     c.execute("DELETE FROM offers")
+    c.execute("DELETE FROM expired_links")
     conn.commit()
     conn.close()
+    _known_links = None
+    _expired_hashes = None
     print("Database cleared")
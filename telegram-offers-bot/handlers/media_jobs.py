@@ -0,0 +1,201 @@
+"""
+تنفيذ مهام الوسائط - Media Jobs
+نفس الكود يعمل داخل البوت مباشرة أو في worker.py عبر طابور العمل المشترك
+"""
+
+import logging
+import os
+import tempfile
+from urllib.parse import quote
+
+import aiohttp
+
+from config import DOCUMENT_MAX_BYTES, DOWNLOAD_CHUNK_SIZE
+from tracing import span, record_span, http_trace_config
+from progress import progress_message, report_transfer
+from handlers.media_tools import (
+    remove_background, download_video, run_image_pipeline, PIPELINE_ORDER, required_input_side,
+    remove_watermark, remove_text_from_image, crop_phone_frame
+)
+
+logger = logging.getLogger(__name__)
+
+# mode -> (الدالة، اسم الملف بدون امتداد، رسالة البدء، رسالة النجاح)
+# الامتداد من الناتج نفسه (IMAGE_OUTPUT_FORMATS)
+IMAGE_MODES = {
+    'watermark': (remove_watermark, "no_watermark", "🔄 جاري إزالة العلامة المائية...", "✅ تم إزالة العلامة المائية!"),
+    'text': (remove_text_from_image, "no_text", "🔄 جاري إزالة الكتابة...", "✅ تم إزالة الكتابة!"),
+    'crop': (crop_phone_frame, "cropped", "🔄 جاري قص الإطار...", "✅ تم قص الإطار!"),
+    'background': (remove_background, "no_background", "🔄 جاري إزالة الخلفية...", "✅ تم إزالة الخلفية!"),
+}
+
+
+# كلمات كل عملية في التعليق
+MODE_KEYWORDS = {
+    'watermark': ['علامة', 'ووتر', 'watermark', 'شعار', 'لوقو'],
+    'text': ['كتابة', 'نص', 'text', 'كلام'],
+    'crop': ['قص', 'اطار', 'crop', 'frame', 'شريط'],
+    'background': ['خلفية', 'خلفيه', 'background'],
+}
+MODE_NAMES = {'watermark': 'العلامة المائية', 'text': 'الكتابة', 'crop': 'الإطار', 'background': 'الخلفية'}
+
+
+def detect_image_modes(caption: str) -> list:
+    """العمليات المطلوبة من التعليق - يمكن ربطها: "قص + نص + خلفية" (بدون تعليق: إزالة الخلفية)"""
+    caption = (caption or "").lower().strip()
+    modes = [mode for mode in PIPELINE_ORDER if any(x in caption for x in MODE_KEYWORDS[mode])]
+    return modes or ['background']
+
+
+def image_start_message(modes: list) -> str:
+    if len(modes) == 1:
+        return IMAGE_MODES[modes[0]][2]
+    return "🔄 جاري المعالجة: " + " + ".join(MODE_NAMES[mode] for mode in modes) + "..."
+
+
+def pick_photo_size(photos, modes: list):
+    """أصغر PhotoSize يكفي العمليات المطلوبة بدل photo[-1] دائماً (update.message.photo مرتبة تصاعدياً)"""
+    side = required_input_side(modes)
+    if side:
+        for photo in photos:
+            if max(photo.width, photo.height) >= side:
+                return photo
+    return photos[-1]
+
+
+async def download_telegram_file(bot, file_id: str):
+    """تحميل ملف من تيليجرام كما وصل من الشبكة (bytes بدون نسخ إضافية)
+    
+    download_as_bytearray() ينسخ الرد إلى bytearray، ثم bytes() تنسخه مرة ثانية
+    """
+    file = await bot.get_file(file_id)
+    if not file.file_path.startswith(('http://', 'https://')):
+        # وضع Bot API المحلي: file_path مسار على القرص
+        return await file.download_as_bytearray()
+    return await bot.request.retrieve(quote(file.file_path, safe=':/'))
+
+
+async def stream_telegram_file(bot, file_id: str, path: str, max_bytes: int = DOCUMENT_MAX_BYTES) -> str:
+    """تحميل ملف من تيليجرام إلى القرص على أجزاء - الذاكرة لا تحمل الملف كاملاً أبداً"""
+    file = await bot.get_file(file_id)
+    if file.file_size and file.file_size > max_bytes:
+        raise ValueError(f"File too large: {file.file_size} bytes")
+    if not file.file_path.startswith(('http://', 'https://')):
+        # وضع Bot API المحلي: الملف موجود على القرص
+        return file.file_path
+    
+    size = 0
+    async with aiohttp.ClientSession(trace_configs=[http_trace_config()]) as session:
+        async with session.get(quote(file.file_path, safe=':/'), timeout=aiohttp.ClientTimeout(total=300)) as response:
+            response.raise_for_status()
+            total = response.content_length or file.file_size
+            with open(path, 'wb') as f:
+                async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise ValueError(f"File too large: over {max_bytes} bytes")
+                    f.write(chunk)
+                    report_transfer(size, total)
+    return path
+
+
+async def run_image_job(bot, chat_id, modes: list, file_id: str, document: bool = False,
+                        status_message_id: int = None) -> bool:
+    """تحميل الصورة من تيليجرام، معالجتها، وإرسال النتيجة
+    
+    document: صورة مرسلة كملف - تُحمَّل للقرص وتُفك بذاكرة محدودة بدل تحميلها كاملة
+    status_message_id: رسالة الحالة التي تُعدَّل بنسبة التحميل والمرحلة
+    """
+    async with progress_message(bot, chat_id, status_message_id) as progress:
+        return await _run_image_job(bot, chat_id, modes, file_id, document, progress)
+
+
+async def _run_image_job(bot, chat_id, modes, file_id, document, progress) -> bool:
+    if len(modes) == 1:
+        tool, filename, _, success_msg = IMAGE_MODES[modes[0]]
+    else:
+        # عدة عمليات: فك ترميز واحد وترميز واحد
+        tool = lambda image: run_image_pipeline(image, modes)
+        filename, success_msg = "edited", "✅ تمت المعالجة!"
+    try:
+        if document:
+            # الأدوات تقبل مسار ملف أيضاً (run_image_pipeline ← _load_image_file)
+            with tempfile.TemporaryDirectory() as workdir:
+                if progress:
+                    progress.stage("📥 جاري تحميل الملف...")
+                path = await stream_telegram_file(bot, file_id, os.path.join(workdir, 'input'))
+                if progress:
+                    progress.stage(image_start_message(modes))
+                result = await tool(path)
+        else:
+            # الأدوات تقبل أي كائن buffer (bytes/bytearray/memoryview) - np.frombuffer بدون نسخ
+            photo = await download_telegram_file(bot, file_id)
+            result = await tool(photo)
+
+        if result:
+            await bot.send_document(
+                chat_id=chat_id,
+                document=result,
+                filename=filename + os.path.splitext(getattr(result, 'name', '.png'))[1],
+                caption=success_msg
+            )
+            return True
+        await bot.send_message(chat_id=chat_id, text="❌ فشلت العملية - جرب صورة أخرى")
+    except Exception as e:
+        logger.error(f"Photo error: {e}")
+        await bot.send_message(chat_id=chat_id, text="❌ حدث خطأ")
+    return False
+
+
+async def run_download_job(bot, chat_id, url: str, status_message_id: int = None) -> bool:
+    """تحميل الفيديو/الصورة من الرابط وإرساله
+    
+    status_message_id: رسالة "جاري التحميل" - تُعدَّل بالنسبة ثم المرحلة، وتُحذف عند الانتهاء
+    """
+    async with progress_message(bot, chat_id, status_message_id) as progress:
+        return await _run_download_job(bot, chat_id, url, progress)
+
+
+async def _run_download_job(bot, chat_id, url, progress) -> bool:
+    try:
+        if progress:
+            progress.stage("📥 جاري التحميل...")
+        result = await download_video(url)
+        if result:
+            if progress:
+                progress.stage("📤 جاري الإرسال...")
+            with span('telegram_upload', type=result['type'], bytes=len(result['file'].getvalue())):
+                if result['type'] == 'video':
+                    await bot.send_video(
+                        chat_id=chat_id,
+                        video=result['file'],
+                        caption="✅ تم التحميل بدون علامة مائية!"
+                    )
+                else:
+                    await bot.send_photo(
+                        chat_id=chat_id,
+                        photo=result['file'],
+                        caption="✅ تم التحميل!"
+                    )
+            return True
+        await bot.send_message(chat_id=chat_id, text="❌ فشل التحميل - جرب مرة ثانية")
+    except Exception as e:
+        logger.error(f"Download error: {e}")
+        await bot.send_message(chat_id=chat_id, text="❌ حدث خطأ في التحميل")
+    return False
+
+
+async def run_job(bot, job: dict) -> bool:
+    """تنفيذ مهمة من الطابور حسب نوعها (ضمن رحلة البوت إن وُجد trace_id)"""
+    payload = job['payload']
+    with span('media_job', trace_id=payload.get('trace_id'), kind=job['kind'], job_id=job['id']):
+        record_span('queue_wait', job['created_at'], job['started_at'])
+        if job['kind'] == 'image':
+            # مهام قديمة في الطابور تحمل mode واحداً
+            modes = payload.get('modes') or [payload['mode']]
+            return await run_image_job(bot, job['chat_id'], modes, payload['file_id'], payload.get('document', False),
+                                       payload.get('status_message_id'))
+        if job['kind'] == 'download':
+            return await run_download_job(bot, job['chat_id'], payload['url'], payload.get('status_message_id'))
+        logger.error(f"Unknown job kind: {job['kind']}")
+        return False
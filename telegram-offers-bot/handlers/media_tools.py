@@ -7,9 +7,21 @@
 import re
 import aiohttp
 from io import BytesIO
-from PIL import Image
+import os
 import logging
 import asyncio
+import time
+from PIL import Image
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import timed, BACKEND_SECONDS, BACKEND_RESULTS, BACKEND_BYTES, ENCODE_SECONDS, ENCODE_BYTES
+from tracing import traced, set_attribute, http_trace_config
+from progress import report_transfer
+from config import (
+    IMAGE_WORK_MAX_SIDE, INPAINT_REGION_MIN_PIXELS, INPAINT_MAX_COMPONENTS, INPAINT_TILE_SIZE,
+    IMAGE_OUTPUT_FORMATS, PNG_COMPRESSION, JPEG_QUALITY, BACKGROUND_INPUT_SIDE, IMAGE_MAX_SIDE, IMAGE_MAX_PIXELS,
+    DOWNLOAD_CHUNK_SIZE
+)
 
 logger = logging.getLogger(__name__)
 
@@ -32,53 +44,19 @@ def get_rembg_session():
 # ============== إزالة الخلفية ==============
 
 async def remove_background(image_bytes: bytes) -> BytesIO | None:
-    """إزالة الخلفية من الصورة - Rembg (AI محلي، مجاني، غير محدود)"""
-    
-    # محاولة 1: Rembg (الأفضل - مجاني وغير محدود)
-    result = await remove_bg_rembg(image_bytes)
-    if result:
-        return result
+    """إزالة الخلفية من الصورة - Rembg (AI محلي، مجاني، غير محدود)
     
-    # محاولة 2: PhotoRoom API (احتياطي)
-    result = await remove_bg_photoroom(image_bytes)
-    if result:
-        return result
-    
-    # محاولة 3: إزالة بسيطة للخلفيات البيضاء
-    return simple_white_removal(image_bytes)
-
-
-async def remove_bg_rembg(image_bytes: bytes) -> BytesIO | None:
-    """إزالة الخلفية باستخدام Rembg (AI محلي - مجاني وغير محدود)"""
-    try:
-        session = get_rembg_session()
-        if session is None:
-            logger.warning("Rembg not available, trying fallback")
-            return None
-        
-        from rembg import remove
-        
-        # تشغيل في thread منفصل لعدم تجميد البوت
-        loop = asyncio.get_event_loop()
-        result = await loop.run_in_executor(
-            None,
-            lambda: remove(image_bytes, session=session)
-        )
-        
-        output = BytesIO(result)
-        output.seek(0)
-        logger.info("✅ Background removed with Rembg")
-        return output
-        
-    except Exception as e:
-        logger.error(f"Rembg failed: {e}")
-    return None
+    نفس الترتيب في _background_op: Rembg ثم PhotoRoom ثم إزالة الأبيض،
+    والناتج بصيغة IMAGE_OUTPUT_FORMATS['background']
+    """
+    return await run_image_pipeline(image_bytes, ['background'])
 
 
+@timed(BACKEND_SECONDS, BACKEND_RESULTS, BACKEND_BYTES, backend='remove_bg_photoroom')
 async def remove_bg_photoroom(image_bytes: bytes) -> BytesIO | None:
     """استخدام PhotoRoom Sandbox API"""
     try:
-        async with aiohttp.ClientSession() as session:
+        async with aiohttp.ClientSession(trace_configs=[http_trace_config()]) as session:
             data = aiohttp.FormData()
             data.add_field('image_file', image_bytes, filename='image.png', content_type='image/png')
             
@@ -98,48 +76,14 @@ async def remove_bg_photoroom(image_bytes: bytes) -> BytesIO | None:
     return None
 
 
-async def remove_bg_preview(image_bytes: bytes) -> BytesIO | None:
-    """محاولة الحصول على معاينة من Remove.bg"""
-    try:
-        async with aiohttp.ClientSession() as session:
-            data = aiohttp.FormData()
-            data.add_field('image_file', image_bytes, filename='image.png', content_type='image/png')
-            data.add_field('size', 'preview')
-            
-            async with session.post(
-                'https://api.remove.bg/v1.0/removebg',
-                data=data,
-                timeout=aiohttp.ClientTimeout(total=30)
-            ) as response:
-                if response.status == 200:
-                    content = await response.read()
-                    output = BytesIO(content)
-                    output.seek(0)
-                    return output
-    except Exception as e:
-        logger.warning(f"Remove.bg preview failed: {e}")
-    return None
-
-
+@timed(BACKEND_SECONDS, BACKEND_RESULTS, BACKEND_BYTES, backend='simple_white_removal')
 def simple_white_removal(image_bytes: bytes) -> BytesIO | None:
     """إزالة بسيطة للخلفيات البيضاء"""
     try:
-        img = Image.open(BytesIO(image_bytes)).convert('RGBA')
-        data = img.getdata()
-        
-        new_data = []
-        for item in data:
-            # إذا كان البكسل أبيض أو قريب من الأبيض
-            if item[0] > 240 and item[1] > 240 and item[2] > 240:
-                new_data.append((255, 255, 255, 0))  # شفاف
-            else:
-                new_data.append(item)
-        
-        img.putdata(new_data)
-        output = BytesIO()
-        img.save(output, format='PNG')
-        output.seek(0)
-        return output
+        img = _decode_image(image_bytes)
+        if img is None:
+            return None
+        return _encode_image(_white_to_alpha(img), IMAGE_OUTPUT_FORMATS['background'])
     except Exception as e:
         logger.error(f"Simple removal failed: {e}")
     return None
@@ -147,138 +91,484 @@ def simple_white_removal(image_bytes: bytes) -> BytesIO | None:
 
 # ============== إزالة العلامات المائية ==============
 
+def _watermark_mask(img):
+    """قناع المناطق البيضاء/الشفافة (العلامات المائية)"""
+    import cv2
+    import numpy as np
+    
+    # تحويل لـ HSV للكشف عن المناطق الفاتحة جداً
+    hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+    lower_white = np.array([0, 0, 200])
+    upper_white = np.array([180, 30, 255])
+    mask = cv2.inRange(hsv, lower_white, upper_white)
+    
+    # توسيع القناع قليلاً
+    kernel = np.ones((3, 3), np.uint8)
+    return cv2.dilate(mask, kernel, iterations=1)
+
+
+def _text_mask(img):
+    """قناع الكتابة من الحواف (النص عادة له حواف واضحة)"""
+    import cv2
+    import numpy as np
+    
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    edges = cv2.Canny(gray, 50, 150)
+    kernel = np.ones((3, 3), np.uint8)
+    return cv2.dilate(edges, kernel, iterations=2)
+
+
+_inpaint_pool = None
+
+
+def _merge_boxes(boxes, gap):
+    """دمج المستطيلات المتداخلة أو الأقرب من gap (حروف نفس السطر تصبح مستطيلاً واحداً)"""
+    merged = []
+    for x, y, w, h in sorted(boxes):
+        box = [x, y, x + w, y + h]
+        changed = True
+        while changed:
+            changed = False
+            for other in merged:
+                if box[0] - gap <= other[2] and other[0] - gap <= box[2] and box[1] - gap <= other[3] and other[1] - gap <= box[3]:
+                    box = [min(box[0], other[0]), min(box[1], other[1]), max(box[2], other[2]), max(box[3], other[3])]
+                    merged.remove(other)
+                    changed = True
+                    break
+        merged.append(box)
+    return [(x0, y0, x1 - x0, y1 - y0) for x0, y0, x1, y1 in merged]
+
+
+def _mask_regions(mask, gap=0):
+    """مستطيلات (x, y, w, h) تغطي القناع: المكونات المتصلة (مدموجة)، أو مربعات ثابتة إذا كثرت المكونات"""
+    import cv2
+    
+    count, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+    if count - 1 <= INPAINT_MAX_COMPONENTS:
+        return _merge_boxes([tuple(int(v) for v in stats[i, :4]) for i in range(1, count)], gap)
+    
+    # كتابة كثيفة = آلاف المكونات الصغيرة - المربعات التي فيها قناع فقط
+    height, width = mask.shape
+    return [
+        (x, y, min(INPAINT_TILE_SIZE, width - x), min(INPAINT_TILE_SIZE, height - y))
+        for y in range(0, height, INPAINT_TILE_SIZE)
+        for x in range(0, width, INPAINT_TILE_SIZE)
+        if mask[y:y + INPAINT_TILE_SIZE, x:x + INPAINT_TILE_SIZE].any()
+    ]
+
+
+def _inpaint_regions(img, mask, radius, flags):
+    """Inpainting لكل منطقة داخل مستطيلها فقط وبالتوازي، ثم الدمج في نسخة واحدة
+
+    القناع الصغير يُعالج دفعة واحدة كما كان (نفس النتيجة تماماً).
+    النتيجة المقسّمة ليست مطابقة بالبكسل لـ inpaint على الصورة كاملة: ترتيب الملء عند حواف
+    المستطيل يختلف (40 سطر نص على 1200x1600: أقصى فرق 153 ومتوسط 0.0017)، وعلى نواة
+    واحدة أبطأ قليلاً (1.36 ث مقابل 1.19 ث) - الفائدة فقط مع عدة أنوية.
+    """
+    global _inpaint_pool
+    import cv2
+    
+    if cv2.countNonZero(mask) < INPAINT_REGION_MIN_PIXELS:
+        return cv2.inpaint(img, mask, inpaintRadius=radius, flags=flags)
+    
+    height, width = mask.shape
+    # هامش حول كل منطقة: inpaint يقرأ البكسلات المجاورة ضمن نصف القطر
+    pad = 2 * radius + 1
+    
+    def inpaint_region(region):
+        x, y, w, h = region
+        x0, y0 = max(0, x - pad), max(0, y - pad)
+        x1, y1 = min(width, x + w + pad), min(height, y + h + pad)
+        repaired = cv2.inpaint(img[y0:y1, x0:x1], mask[y0:y1, x0:x1], inpaintRadius=radius, flags=flags)
+        return region, repaired[y - y0:y - y0 + h, x - x0:x - x0 + w]
+    
+    if _inpaint_pool is None:
+        # OpenCV يحرر الـ GIL أثناء inpaint - threads تكفي لاستخدام كل الأنوية
+        _inpaint_pool = ThreadPoolExecutor(max_workers=os.cpu_count() or 2, thread_name_prefix='inpaint')
+    
+    result = img.copy()
+    # الدمج بمسافة 2*pad يجمع أسطر النص المتقاربة: نص متعدد الأسطر يصبح مستطيلاً يكاد يغطي
+    # الصورة كلها (منطقة واحدة بلا توازٍ) - التوازي ينفع أساساً مع علامات متباعدة أو المربعات
+    for (x, y, w, h), repaired in _inpaint_pool.map(inpaint_region, _mask_regions(mask, 2 * pad)):
+        core = mask[y:y + h, x:x + w] > 0
+        result[y:y + h, x:x + w][core] = repaired[core]
+    return result
+
+
+def _inpaint_bounded(img, mask_fn, radius, flags, max_side=IMAGE_WORK_MAX_SIDE):
+    """القناع والـ Inpainting بدقة عمل محدودة، ثم إرجاع المناطق المصلحة فقط للأصل
+
+    تكلفة inpaint تكبر مع مساحة القناع، والصورة مضغوطة أصلاً من تيليجرام -
+    التفاصيل خارج القناع تبقى من الأصل بدقتها الكاملة.
+    """
+    import cv2
+    
+    height, width = img.shape[:2]
+    scale = max_side / max(height, width) if max_side else 1
+    if scale >= 1:
+        return _inpaint_regions(img, mask_fn(img), radius, flags)
+    
+    small = cv2.resize(img, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+    small_mask = mask_fn(small)
+    if not small_mask.any():
+        return img
+    repaired = _inpaint_regions(small, small_mask, max(1, round(radius * scale)), flags)
+    
+    # تكبير مستطيل المنطقة المصلحة فقط (مع هامش بكسل للحواف)
+    x, y, w, h = cv2.boundingRect(small_mask)
+    x0, y0 = max(0, x - 1), max(0, y - 1)
+    x1, y1 = min(small.shape[1], x + w + 1), min(small.shape[0], y + h + 1)
+    fx0, fy0 = int(x0 / scale), int(y0 / scale)
+    fx1, fy1 = min(width, round(x1 / scale)), min(height, round(y1 / scale))
+    roi_size = (fx1 - fx0, fy1 - fy0)
+    patch = cv2.resize(repaired[y0:y1, x0:x1], roi_size, interpolation=cv2.INTER_CUBIC)
+    patch_mask = cv2.resize(small_mask[y0:y1, x0:x1], roi_size, interpolation=cv2.INTER_NEAREST)
+    
+    result = img.copy()
+    roi = result[fy0:fy1, fx0:fx1]
+    roi[patch_mask > 0] = patch[patch_mask > 0]
+    return result
+
+
+@timed(BACKEND_SECONDS, BACKEND_RESULTS, BACKEND_BYTES, backend='remove_watermark')
 async def remove_watermark(image_bytes: bytes) -> BytesIO | None:
     """إزالة العلامات المائية الشفافة/البيضاء من الصورة"""
-    try:
-        import cv2
-        import numpy as np
-        
-        # تحويل إلى مصفوفة
-        nparr = np.frombuffer(image_bytes, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        
-        if img is None:
-            return None
-        
-        # تحويل لـ HSV للكشف عن المناطق الفاتحة جداً
-        hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
-        
-        # قناع للعلامات البيضاء/الشفافة
-        lower_white = np.array([0, 0, 200])
-        upper_white = np.array([180, 30, 255])
-        mask = cv2.inRange(hsv, lower_white, upper_white)
-        
-        # توسيع القناع قليلاً
-        kernel = np.ones((3, 3), np.uint8)
-        mask = cv2.dilate(mask, kernel, iterations=1)
-        
-        # Inpainting لملء المناطق
-        result = cv2.inpaint(img, mask, inpaintRadius=3, flags=cv2.INPAINT_TELEA)
-        
-        # حفظ النتيجة
-        _, buffer = cv2.imencode('.png', result)
-        output = BytesIO(buffer.tobytes())
-        output.seek(0)
+    result = await run_image_pipeline(image_bytes, ['watermark'])
+    if result:
         logger.info("✅ Watermark removed")
-        return output
-        
-    except Exception as e:
-        logger.error(f"Watermark removal failed: {e}")
-    return None
+    return result
 
 
+@timed(BACKEND_SECONDS, BACKEND_RESULTS, BACKEND_BYTES, backend='remove_text_from_image')
 async def remove_text_from_image(image_bytes: bytes) -> BytesIO | None:
     """إزالة الكتابة من الصورة باستخدام Inpainting"""
-    try:
-        import cv2
-        import numpy as np
-        
-        nparr = np.frombuffer(image_bytes, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        
-        if img is None:
-            return None
-        
-        # تحويل لتدرج الرمادي
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        
-        # الكشف عن الحواف (النص عادة له حواف واضحة)
-        edges = cv2.Canny(gray, 50, 150)
-        
-        # توسيع الحواف
-        kernel = np.ones((3, 3), np.uint8)
-        dilated = cv2.dilate(edges, kernel, iterations=2)
-        
-        # Inpainting
-        result = cv2.inpaint(img, dilated, inpaintRadius=5, flags=cv2.INPAINT_NS)
-        
-        _, buffer = cv2.imencode('.png', result)
-        output = BytesIO(buffer.tobytes())
-        output.seek(0)
+    result = await run_image_pipeline(image_bytes, ['text'])
+    if result:
         logger.info("✅ Text removed from image")
-        return output
-        
-    except Exception as e:
-        logger.error(f"Text removal failed: {e}")
-    return None
+    return result
 
 
+@timed(BACKEND_SECONDS, BACKEND_RESULTS, BACKEND_BYTES, backend='crop_phone_frame')
 async def crop_phone_frame(image_bytes: bytes) -> BytesIO | None:
     """قص إطار الجوال (شريط الحالة والأزرار)"""
+    result = await run_image_pipeline(image_bytes, ['crop'])
+    if result:
+        logger.info("✅ Phone frame cropped")
+    return result
+
+
+# ============== سلسلة عمليات الصور ==============
+# فك الترميز مرة واحدة، كل عملية تستلم مصفوفة NumPy (BGR) وترجع مصفوفة، والترميز مرة في النهاية
+
+def _decode_image(image_bytes):
+    """image_bytes: أي كائن buffer - بدون نسخ قبل فك الترميز - أو مسار ملف على القرص"""
+    import cv2
+    import numpy as np
+    if isinstance(image_bytes, (str, os.PathLike)):
+        return _load_image_file(image_bytes)
+    return cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+
+
+# علامات SOF (بداية الإطار) التي تحمل أبعاد JPEG - C4/C8/CC ليست إطارات
+_JPEG_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def _jpeg_size(path):
+    """(العرض، الارتفاع) من ترويسة JPEG فقط - None إذا لم يكن JPEG صالحاً"""
+    with open(path, 'rb') as f:
+        if f.read(2) != b'\xff\xd8':
+            return None
+        while True:
+            byte = f.read(1)
+            if not byte:
+                return None
+            if byte != b'\xff':
+                continue
+            marker = f.read(1)
+            while marker == b'\xff':
+                marker = f.read(1)
+            if not marker:
+                return None
+            code = marker[0]
+            # علامات بدون طول: RST0-7 و SOI و TEM
+            if code in (0x01, 0xD8) or 0xD0 <= code <= 0xD7:
+                continue
+            header = f.read(2)
+            if len(header) < 2 or code == 0xD9:
+                return None
+            length = int.from_bytes(header, 'big')
+            if code in _JPEG_SOF:
+                frame = f.read(5)
+                if len(frame) < 5:
+                    return None
+                return int.from_bytes(frame[3:5], 'big'), int.from_bytes(frame[1:3], 'big')
+            f.seek(length - 2, os.SEEK_CUR)
+
+
+def _load_image_file(path):
+    """فك ترميز ملف صورة بذاكرة محدودة (الضلع الأطول <= IMAGE_MAX_SIDE)
+    
+    JPEG: libjpeg يفك الترميز مباشرة بنصف/ربع/ثمن الدقة (IMREAD_REDUCED_*)
+    فصورة 100 ميجابكسل لا تُحمَّل كاملة في الذاكرة أبداً
+    """
+    import cv2
+    
+    # الأبعاد من ترويسة الملف فقط. Pillow يرفض ما فوق ~179 ميجابكسل - لا نلمس حده العام
+    # (يحمي باقي الخيوط)، بل نقرأ أبعاد JPEG من ترويسته لأنه يُفك مصغراً؛ الباقي أكبر من
+    # IMAGE_MAX_PIXELS على أي حال
     try:
-        import cv2
-        import numpy as np
-        
-        nparr = np.frombuffer(image_bytes, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        
+        with Image.open(path) as probe:
+            width, height = probe.size
+            fmt = probe.format
+    except Image.DecompressionBombError as e:
+        size = _jpeg_size(path)
+        if size is None:
+            logger.warning(f"Image too large to decode: {e}")
+            return None
+        (width, height), fmt = size, 'JPEG'
+    
+    factor = 1
+    while max(width, height) / factor > IMAGE_MAX_SIDE and factor < 8:
+        factor *= 2
+    if fmt == 'JPEG' and factor > 1:
+        flag = {2: cv2.IMREAD_REDUCED_COLOR_2, 4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8}[factor]
+    elif width * height > IMAGE_MAX_PIXELS:
+        logger.warning(f"Image too large to decode: {width}x{height} {fmt}")
+        return None
+    else:
+        flag = cv2.IMREAD_COLOR
+    
+    img = cv2.imread(str(path), flag)
+    if img is not None and max(img.shape[:2]) > IMAGE_MAX_SIDE:
+        scale = IMAGE_MAX_SIDE / max(img.shape[:2])
+        img = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    return img
+
+
+def _encode_image(img, fmt='png') -> BytesIO:
+    """ترميز الناتج - output.name يحمل الامتداد الفعلي (jpeg مع شفافية يصبح png)"""
+    import cv2
+    
+    if fmt == 'jpeg' and img.ndim == 3 and img.shape[2] == 4:
+        fmt = 'png'
+    if fmt == 'webp':
+        # جودة أعلى من 100 = WebP بدون فقد
+        ext, params = '.webp', [cv2.IMWRITE_WEBP_QUALITY, 101]
+    elif fmt == 'jpeg':
+        ext, params = '.jpg', [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY]
+    else:
+        fmt, ext, params = 'png', '.png', [cv2.IMWRITE_PNG_COMPRESSION, PNG_COMPRESSION]
+    
+    start = time.perf_counter()
+    _, buffer = cv2.imencode(ext, img, params)
+    ENCODE_SECONDS.observe(time.perf_counter() - start, format=fmt)
+    ENCODE_BYTES.observe(buffer.nbytes, format=fmt)
+    
+    # النسخة الوحيدة: تيليجرام يحتاج bytes، وBytesIO يشارك نفس الكائن حتى الرفع
+    # (لا getbuffer() على الناتج - ينسخه ويلغي المشاركة)
+    output = BytesIO(buffer.tobytes())
+    output.name = f"image{ext}"
+    output.seek(0)
+    return output
+
+
+def output_format(ops) -> str:
+    """صيغة ناتج السلسلة = صيغة آخر عملية فيها (الخلفية دائماً الأخيرة)"""
+    return IMAGE_OUTPUT_FORMATS.get(max(ops, key=PIPELINE_ORDER.index), 'png')
+
+
+# كشف شريط الحالة وشريط التنقل: صفوف متتالية بلون خلفية واحد
+BAR_WORK_ROWS = 600         # عدد الصفوف بعد التصغير
+BAR_WORK_COLS = 64
+BAR_COLOR_TOL = 12          # فرق الرمادي المسموح داخل الشريط
+BAR_MIN_UNIFORM = 0.55      # نسبة أعمدة الصف بلون الخلفية (الأيقونات والساعة تشغل الباقي)
+BAR_MIN_SHARE = 0.01        # حدود ارتفاع الشريط من ارتفاع الصورة
+BAR_MAX_SHARE = 0.08
+BAR_FALLBACK_SHARE = 0.05   # القص الثابت القديم عند فشل الكشف
+
+
+def _uniform_band(rows):
+    """عدد الصفوف من البداية التي تشكل شريطاً بلون الصف الأول (rows: صفوف رمادية مصغرة)"""
+    import numpy as np
+    
+    medians = np.median(rows, axis=1)
+    uniform = (np.abs(rows - medians[:, None]) <= BAR_COLOR_TOL).mean(axis=1) >= BAR_MIN_UNIFORM
+    in_band = uniform & (np.abs(medians - medians[0]) <= BAR_COLOR_TOL)
+    return len(in_band) if in_band.all() else int(np.argmin(in_band))
+
+
+def _detect_phone_bars(img):
+    """(أعلى، أسفل) حدود المحتوى بعد إزالة الشريطين - None للجهة التي لم يُكشف فيها شريط"""
+    import cv2
+    import numpy as np
+    
+    height = img.shape[0]
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+    work_rows = min(height, BAR_WORK_ROWS)
+    small = cv2.resize(gray, (BAR_WORK_COLS, work_rows), interpolation=cv2.INTER_AREA).astype(np.int16)
+    scale = height / work_rows
+    
+    def side(rows_small, full_rows):
+        band = _uniform_band(rows_small)
+        if not BAR_MIN_SHARE * work_rows <= band < BAR_MAX_SHARE * work_rows:
+            return None
+        # تدقيق الحد بالدقة الكاملة في نافذة صغيرة حوله
+        window = min(len(full_rows), int((band + 2) * scale) + 1)
+        strip = cv2.resize(full_rows[:window], (BAR_WORK_COLS, window), interpolation=cv2.INTER_AREA).astype(np.int16)
+        refined = _uniform_band(strip)
+        # الشريط موجود لكن التدقيق لم يجد حداً - النسبة المعتادة لهذه الجهة بدل عدم القص
+        return refined or int(len(full_rows) * BAR_FALLBACK_SHARE)
+    
+    top = side(small, gray)
+    bottom = side(small[::-1], gray[::-1])
+    return top, None if bottom is None else height - bottom
+
+
+def _crop_op(img):
+    # قص شريط الحالة وشريط التنقل المكتشفين
+    # شريط حالة بدون شريط تنقل = لقطة بالإيماءات بلا شريط سفلي، لا قص من الأسفل
+    # لم يُكشف شيء: النسب المعتادة (~5%) من الجهتين
+    # (شريط كُشف ولم يُدقَّق حده يأخذ النسبة المعتادة لجهته داخل _detect_phone_bars)
+    height = img.shape[0]
+    top, bottom = _detect_phone_bars(img)
+    if top is None:
+        top = int(height * BAR_FALLBACK_SHARE)
+        if bottom is None:
+            bottom = int(height * (1 - BAR_FALLBACK_SHARE))
+    elif bottom is None:
+        bottom = height
+    return img[top:bottom, :]
+
+
+def _watermark_op(img):
+    import cv2
+    return _inpaint_bounded(img, _watermark_mask, 3, cv2.INPAINT_TELEA)
+
+
+def _text_op(img):
+    import cv2
+    return _inpaint_bounded(img, _text_mask, 5, cv2.INPAINT_NS)
+
+
+def _white_to_alpha(img):
+    """نفس simple_white_removal على المصفوفة مباشرة (BGRA)"""
+    import cv2
+    bgra = cv2.cvtColor(img, cv2.COLOR_BGR2BGRA)
+    bgra[(img > 240).all(axis=2)] = (255, 255, 255, 0)
+    return bgra
+
+
+# الزمن فقط: الناتج مصفوفة دائماً (الإزالة البسيطة آخر بديل) فلا معنى لعداد ok/empty
+@timed(BACKEND_SECONDS, backend='remove_background')
+async def _background_op(img):
+    """إزالة الخلفية - Rembg على المصفوفة، ثم PhotoRoom، ثم إزالة الأبيض"""
+    import cv2
+    import numpy as np
+    
+    session = get_rembg_session()
+    if session is not None:
+        try:
+            from rembg import remove
+            rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+            rgba = await asyncio.get_running_loop().run_in_executor(None, lambda: remove(rgb, session=session))
+            return cv2.cvtColor(np.asarray(rgba), cv2.COLOR_RGBA2BGRA)
+        except Exception as e:
+            logger.error(f"Rembg failed: {e}")
+    
+    result = await remove_bg_photoroom(_encode_image(img, 'png').getvalue())
+    if result:
+        decoded = cv2.imdecode(np.frombuffer(result.getvalue(), np.uint8), cv2.IMREAD_UNCHANGED)
+        if decoded is not None:
+            return decoded
+    return _white_to_alpha(img)
+
+
+PIPELINE_OPS = {
+    'crop': _crop_op,
+    'watermark': _watermark_op,
+    'text': _text_op,
+    'background': _background_op,
+}
+# الترتيب ثابت مهما كان ترتيب التعليق: القص أولاً (بكسلات أقل) والخلفية أخيراً (الناتج بقناة شفافية)
+PIPELINE_ORDER = ('crop', 'watermark', 'text', 'background')
+# الضلع الأطول الذي يحتاجه ناتج كل عملية (0 = أكبر دقة متاحة)
+# القص وإزالة العلامات/الكتابة ترجع صورة المستخدم نفسها فتحتاج الدقة الكاملة
+PIPELINE_INPUT_SIDE = {'crop': 0, 'watermark': 0, 'text': 0, 'background': BACKGROUND_INPUT_SIDE}
+
+
+def required_input_side(ops) -> int:
+    """أقل دقة إدخال تكفي كل العمليات (0 = أكبر دقة متاحة)"""
+    sides = [PIPELINE_INPUT_SIDE[op] for op in ops]
+    return 0 if 0 in sides else max(sides)
+
+
+@timed(BACKEND_SECONDS, BACKEND_RESULTS, BACKEND_BYTES, backend='image_pipeline')
+async def run_image_pipeline(image_bytes: bytes, ops) -> BytesIO | None:
+    """تنفيذ عدة عمليات على الصورة بفك ترميز واحد وترميز واحد (بصيغة output_format)"""
+    loop = asyncio.get_running_loop()
+    try:
+        img = await loop.run_in_executor(None, _decode_image, image_bytes)
         if img is None:
             return None
         
-        height, width = img.shape[:2]
-        
-        # قص النسب المعتادة لإطارات الجوال
-        # شريط الحالة: ~5% من الأعلى
-        # شريط التنقل: ~5% من الأسفل
-        top_crop = int(height * 0.05)
-        bottom_crop = int(height * 0.95)
-        
-        # قص الصورة
-        cropped = img[top_crop:bottom_crop, :]
-        
-        _, buffer = cv2.imencode('.png', cropped)
-        output = BytesIO(buffer.tobytes())
-        output.seek(0)
-        logger.info("✅ Phone frame cropped")
-        return output
+        for op in sorted(set(ops), key=PIPELINE_ORDER.index):
+            func = PIPELINE_OPS[op]
+            if asyncio.iscoroutinefunction(func):
+                img = await func(img)
+            else:
+                # العمليات الثقيلة خارج حلقة الأحداث
+                img = await loop.run_in_executor(None, func, img)
         
+        return await loop.run_in_executor(None, _encode_image, img, output_format(ops))
     except Exception as e:
-        logger.error(f"Crop failed: {e}")
+        logger.error(f"Image pipeline {ops} failed: {e}")
     return None
 
 
 # ============== تحميل الفيديوهات ==============
 
+async def read_media(response) -> bytes:
+    """قراءة ملف الوسائط على أجزاء مع إبلاغ التقدم لرسالة الحالة (إن وُجدت)
+    
+    نفس تكلفة response.read(): الأجزاء تُجمع بـ join واحد في النهاية
+    """
+    total = response.content_length
+    chunks = []
+    done = 0
+    async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+        chunks.append(chunk)
+        done += len(chunk)
+        report_transfer(done, total)
+    return b''.join(chunks)
+
+
+@traced()
 async def download_video(url: str) -> dict | None:
     """تحميل فيديو من الرابط"""
     url_lower = url.lower()
     
     if 'tiktok' in url_lower:
+        set_attribute('platform', 'tiktok')
         return await download_tiktok(url)
     elif 'instagram' in url_lower:
+        set_attribute('platform', 'instagram')
         return await download_instagram(url)
     elif 'pinterest' in url_lower or 'pin.it' in url_lower:
+        set_attribute('platform', 'pinterest')
         return await download_pinterest(url)
     elif 'snapchat' in url_lower:
+        set_attribute('platform', 'snapchat')
         return await download_snapchat(url)
     
     return None
 
 
+@timed(BACKEND_SECONDS, BACKEND_RESULTS, BACKEND_BYTES, backend='download_tiktok')
+@traced()
 async def download_tiktok(url: str) -> dict | None:
     """تحميل فيديو تيك توك بدون علامة مائية"""
     try:
-        async with aiohttp.ClientSession() as session:
+        async with aiohttp.ClientSession(trace_configs=[http_trace_config()]) as session:
             # API الأولى
             api_url = f"https://www.tikwm.com/api/?url={url}"
             async with session.get(api_url, timeout=30) as response:
@@ -290,7 +580,7 @@ async def download_tiktok(url: str) -> dict | None:
                         if video_url:
                             async with session.get(video_url, timeout=60) as vid_response:
                                 if vid_response.status == 200:
-                                    content = await vid_response.read()
+                                    content = await read_media(vid_response)
                                     output = BytesIO(content)
                                     output.seek(0)
                                     output.name = "tiktok_video.mp4"
@@ -305,7 +595,7 @@ async def download_tiktok(url: str) -> dict | None:
                     if video_url:
                         async with session.get(video_url, timeout=60) as vid_response:
                             if vid_response.status == 200:
-                                content = await vid_response.read()
+                                content = await read_media(vid_response)
                                 output = BytesIO(content)
                                 output.seek(0)
                                 output.name = "tiktok_video.mp4"
@@ -315,10 +605,12 @@ async def download_tiktok(url: str) -> dict | None:
     return None
 
 
+@timed(BACKEND_SECONDS, BACKEND_RESULTS, BACKEND_BYTES, backend='download_instagram')
+@traced()
 async def download_instagram(url: str) -> dict | None:
     """تحميل محتوى انستقرام"""
     try:
-        async with aiohttp.ClientSession() as session:
+        async with aiohttp.ClientSession(trace_configs=[http_trace_config()]) as session:
             api_url = "https://api.igram.io/api/ig"
             async with session.post(
                 api_url,
@@ -335,7 +627,7 @@ async def download_instagram(url: str) -> dict | None:
                         if media_url:
                             async with session.get(media_url, timeout=60) as media_response:
                                 if media_response.status == 200:
-                                    content = await media_response.read()
+                                    content = await read_media(media_response)
                                     output = BytesIO(content)
                                     output.seek(0)
                                     if 'video' in item.get('type', '').lower():
@@ -349,6 +641,8 @@ async def download_instagram(url: str) -> dict | None:
     return None
 
 
+@timed(BACKEND_SECONDS, BACKEND_RESULTS, BACKEND_BYTES, backend='download_pinterest')
+@traced()
 async def download_pinterest(url: str) -> dict | None:
     """تحميل محتوى بنترست"""
     try:
@@ -367,7 +661,7 @@ async def download_pinterest(url: str) -> dict | None:
         if not pin_id:
             return None
             
-        async with aiohttp.ClientSession() as session:
+        async with aiohttp.ClientSession(trace_configs=[http_trace_config()]) as session:
             api_url = f"https://api.pinterest.com/v3/pidgets/pins/info/?pin_ids={pin_id}"
             async with session.get(api_url, timeout=30) as response:
                 if response.status == 200:
@@ -385,7 +679,7 @@ async def download_pinterest(url: str) -> dict | None:
                     if image_url:
                         async with session.get(image_url, timeout=60) as img_response:
                             if img_response.status == 200:
-                                content = await img_response.read()
+                                content = await read_media(img_response)
                                 output = BytesIO(content)
                                 output.seek(0)
                                 output.name = "pinterest_image.jpg"
@@ -395,10 +689,12 @@ async def download_pinterest(url: str) -> dict | None:
     return None
 
 
+@timed(BACKEND_SECONDS, BACKEND_RESULTS, BACKEND_BYTES, backend='download_snapchat')
+@traced()
 async def download_snapchat(url: str) -> dict | None:
     """تحميل محتوى سناب شات"""
     try:
-        async with aiohttp.ClientSession() as session:
+        async with aiohttp.ClientSession(trace_configs=[http_trace_config()]) as session:
             async with session.get(url, timeout=30, allow_redirects=True) as response:
                 if response.status == 200:
                     html = await response.text()
@@ -414,7 +710,7 @@ async def download_snapchat(url: str) -> dict | None:
                             video_url = match.group(1).replace('\\u002F', '/')
                             async with session.get(video_url, timeout=60) as vid_response:
                                 if vid_response.status == 200:
-                                    content = await vid_response.read()
+                                    content = await read_media(vid_response)
                                     output = BytesIO(content)
                                     output.seek(0)
                                     output.name = "snapchat_video.mp4"
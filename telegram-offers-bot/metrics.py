@@ -0,0 +1,204 @@
+"""
+مقاييس الأداء - Metrics
+عدادات ومدرجات (histograms) بصيغة Prometheus النصية، تُعرض على GET /metrics
+بدون مكتبات إضافية - آمنة للاستخدام من threads التنفيذ (run_in_executor)
+"""
+
+import asyncio
+import functools
+import logging
+import threading
+import time
+from io import BytesIO
+
+logger = logging.getLogger(__name__)
+
+# حدود المدرجات: الزمن بالثواني، والحجم بالبايت
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+BYTES_BUCKETS = (1024, 10240, 102400, 512000, 1048576, 5242880, 10485760, 52428800)
+
+_lock = threading.Lock()
+_registry = []
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        # (label, value) مرتبة -> القيمة
+        self._values = {}
+        _registry.append(self)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with _lock:
+            items = list(self._values.items())
+        for labels, value in items:
+            lines.append(f"{self.name}{_format_labels(labels)} {value}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """قيمة لحظية - تُضبط يدوياً أو تُحسب عند القراءة عبر set_function"""
+    kind = "gauge"
+
+    def __init__(self, name, help_text):
+        super().__init__(name, help_text)
+        self._functions = {}
+
+    def set(self, value, **labels):
+        with _lock:
+            self._values[tuple(sorted(labels.items()))] = value
+
+    def set_function(self, func, **labels):
+        self._functions[tuple(sorted(labels.items()))] = func
+
+    def render(self):
+        for labels, func in list(self._functions.items()):
+            try:
+                value = func()
+            except Exception as e:
+                logger.warning(f"Gauge {self.name} failed: {e}")
+                continue
+            with _lock:
+                self._values[labels] = value
+        return super().render()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text)
+        self.buckets = buckets
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with _lock:
+            state = self._values.get(key)
+            if state is None:
+                # [عدد كل حد..., المجموع، العدد الكلي]
+                state = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with _lock:
+            items = [(labels, list(state)) for labels, state in self._values.items()]
+        for labels, state in items:
+            for bound, count in zip(self.buckets, state):
+                lines.append(f"{self.name}_bucket{_format_labels(labels + (('le', bound),))} {count}")
+            lines.append(f"{self.name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {state[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {state[-2]}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {state[-1]}")
+        return lines
+
+
+def render() -> str:
+    """كل المقاييس بصيغة Prometheus النصية"""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ===== مقاييس البوت =====
+
+HANDLER_SECONDS = Histogram("bot_handler_seconds", "Telegram handler latency")
+BACKEND_SECONDS = Histogram("media_backend_seconds", "Media backend latency (download_*, remove_bg_*, image tools)")
+BACKEND_RESULTS = Counter("media_backend_results_total", "Media backend outcomes (ok, empty, error)")
+BACKEND_BYTES = Histogram("media_backend_bytes", "Bytes sent to (in) or returned by (out) media backends", BYTES_BUCKETS)
+RENDER_SECONDS = Histogram("offer_image_render_seconds", "create_offer_image latency")
+DB_SECONDS = Histogram("db_query_seconds", "Database call latency")
+ERRORS = Counter("errors_total", "Unhandled errors by component")
+CACHE_REQUESTS = Counter("cache_requests_total", "Cache lookups by cache and result (hit, miss)")
+QUEUE_DEPTH = Gauge("queue_depth", "Items waiting in each queue")
+ENCODE_SECONDS = Histogram("image_encode_seconds", "Image tool output encoding latency by format")
+ENCODE_BYTES = Histogram("image_encode_bytes", "Encoded image tool output size by format", BYTES_BUCKETS)
+
+
+def payload_size(value):
+    """حجم البيانات بالبايت (bytes/BytesIO أو نتيجة تحميل {'file': ...})"""
+    if isinstance(value, dict):
+        value = value.get('file')
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return len(value)
+    if isinstance(value, BytesIO):
+        # getbuffer() ينسخ BytesIO المبني على bytes - getvalue() يرجع نفس الكائن بدون نسخ
+        return len(value.getvalue())
+    return None
+
+
+def timed(histogram, results=None, transfer=None, **labels):
+    """قياس زمن الدالة (عادية أو async) + الأخطاء، واختيارياً النتيجة وحجم البيانات
+
+    results: عداد ok/empty/error (الدوال التي ترجع None عند الفشل)
+    transfer: مدرج يسجّل حجم أول وسيط bytes (in) وحجم النتيجة (out)
+    """
+    def record(start, result, error):
+        histogram.observe(time.perf_counter() - start, **labels)
+        if error:
+            ERRORS.inc(component=histogram.name, **labels)
+        if results is not None:
+            results.inc(result='error' if error else 'ok' if result else 'empty', **labels)
+        if transfer is not None and result is not None:
+            size = payload_size(result)
+            if size is not None:
+                transfer.observe(size, direction='out', **labels)
+
+    def observe_input(args):
+        if transfer is not None and args:
+            size = payload_size(args[0])
+            if size is not None:
+                transfer.observe(size, direction='in', **labels)
+
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                observe_input(args)
+                start = time.perf_counter()
+                try:
+                    result = await func(*args, **kwargs)
+                except Exception:
+                    record(start, None, True)
+                    raise
+                record(start, result, False)
+                return result
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            observe_input(args)
+            start = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except Exception:
+                record(start, None, True)
+                raise
+            record(start, result, False)
+            return result
+        return wrapper
+
+    return decorator
@@ -0,0 +1,112 @@
+"""
+تقدم المهام الطويلة - Progress
+رسالة حالة واحدة تُعدَّل (المرحلة، ترتيب الطابور، نسبة التحميل) بدل الصمت حتى النهاية
+التعديلات محدودة بـ PROGRESS_EDIT_INTERVAL لاحترام حدود تيليجرام
+
+التحميل يبلغ عن تقدمه عبر report_transfer() - بدون تمرير الرسالة لكل دالة
+"""
+
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+
+from telegram.error import BadRequest, RetryAfter, TelegramError
+
+from config import PROGRESS_EDIT_INTERVAL
+from sender import retry_after_seconds
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar('progress', default=None)
+
+
+class ProgressMessage:
+    """تعديل رسالة حالة موجودة - تعديل واحد في كل لحظة وبحد أدنى بين التعديلات"""
+
+    def __init__(self, bot, chat_id, message_id):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.stage_text = ""
+        self._shown = None
+        self._next_edit = 0.0
+        self._pending = None
+        self._closed = False
+
+    def stage(self, text):
+        """مرحلة جديدة (تحميل، رفع...) - تُعرض دائماً بعد أي تعديل جارٍ، بدون إيقاف المهمة"""
+        self.stage_text = text
+        self._pending = asyncio.create_task(self._after(self._pending, text))
+
+    async def _after(self, previous, text):
+        if previous:
+            await previous
+        await self._edit(text)
+
+    def transfer(self, done, total=None):
+        """نسبة التحميل - تُتجاهل إذا لم يمر PROGRESS_EDIT_INTERVAL أو هناك تعديل جارٍ"""
+        if self._closed or (self._pending and not self._pending.done()) or time.monotonic() < self._next_edit:
+            return
+        if total:
+            text = f"{self.stage_text}\n{done * 100 // total}% ({done / 1e6:.1f}/{total / 1e6:.1f}MB)"
+        else:
+            text = f"{self.stage_text}\n{done / 1e6:.1f}MB"
+        self._pending = asyncio.create_task(self._edit(text))
+
+    async def _edit(self, text):
+        if self._closed or text == self._shown:
+            return
+        wait = self._next_edit - time.monotonic()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        self._next_edit = time.monotonic() + PROGRESS_EDIT_INTERVAL
+        try:
+            await self.bot.edit_message_text(chat_id=self.chat_id, message_id=self.message_id, text=text)
+            self._shown = text
+        except RetryAfter as e:
+            self._next_edit = time.monotonic() + retry_after_seconds(e)
+        except BadRequest as e:
+            # الرسالة حُذفت أو لم تتغير - لا فائدة من تعديلات أخرى في الحالة الأولى
+            if 'not modified' not in str(e).lower():
+                self._closed = True
+        except TelegramError as e:
+            logger.warning(f"Progress edit failed: {e}")
+
+    async def close(self):
+        """حذف رسالة الحالة - النتيجة أو رسالة الفشل تُرسل منفصلة"""
+        self._closed = True
+        if self._pending and not self._pending.done():
+            # تعديل ينتظر دوره لم يعد له معنى
+            self._pending.cancel()
+            try:
+                await self._pending
+            except asyncio.CancelledError:
+                pass
+        try:
+            await self.bot.delete_message(chat_id=self.chat_id, message_id=self.message_id)
+        except TelegramError:
+            pass
+
+
+@asynccontextmanager
+async def progress_message(bot, chat_id, message_id):
+    """رسالة الحالة للمهمة الحالية - None بدون message_id (مثل مهام قديمة في الطابور)"""
+    if not message_id:
+        yield None
+        return
+    progress = ProgressMessage(bot, chat_id, message_id)
+    token = _current.set(progress)
+    try:
+        yield progress
+    finally:
+        _current.reset(token)
+        await progress.close()
+
+
+def report_transfer(done, total=None):
+    """يُستدعى من حلقات التحميل - لا شيء إذا لم تكن هناك رسالة حالة"""
+    progress = _current.get()
+    if progress is not None:
+        progress.transfer(done, total)
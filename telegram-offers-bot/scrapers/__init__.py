@@ -0,0 +1,14 @@
+# Scrapers package
+from scrapers.engine import create_session, scrape_all, scrape_source
+from scrapers.rss_scraper import build_sources
+
+
+async def fetch_all_rss_feeds(rss_feeds) -> list:
+    """سحب كل المصادر وإرجاع العروض في قائمة واحدة"""
+    offers = []
+
+    async def collect(source, source_offers):
+        offers.extend(source_offers)
+
+    await scrape_all(build_sources(rss_feeds), on_result=collect)
+    return offers
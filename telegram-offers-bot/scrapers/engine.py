@@ -0,0 +1,131 @@
+"""
+محرك السحب المتوازي - asyncio
+جلسة HTTP مشتركة، مهلة لكل مصدر، وتسليم نتائج كل مصدر فور انتهائه
++ طلبات شرطية (ETag/Last-Modified) وتخطي تحليل الصفحات التي لم تتغير
+"""
+
+import asyncio
+import hashlib
+import logging
+
+import aiohttp
+
+from config import SCRAPE_SOURCE_TIMEOUT, SCRAPE_REQUEST_TIMEOUT, SCRAPE_MAX_CONNECTIONS, SCRAPE_USER_AGENT
+from database import get_source_cache, save_source_cache
+from metrics import CACHE_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+
+def create_session() -> aiohttp.ClientSession:
+    """جلسة مشتركة لكل المصادر (إعادة استخدام الاتصالات)"""
+    return aiohttp.ClientSession(
+        timeout=aiohttp.ClientTimeout(total=SCRAPE_REQUEST_TIMEOUT),
+        connector=aiohttp.TCPConnector(limit=SCRAPE_MAX_CONNECTIONS),
+        headers={'User-Agent': SCRAPE_USER_AGENT},
+    )
+
+
+async def fetch_page(session: aiohttp.ClientSession, url: str, conditional=True, cached=None):
+    """تحميل صفحة - يرجع (النص، بيانات التخزين) أو None إذا فشل أو لم تتغير منذ آخر سحب
+
+    cached: آخر بيانات تخزين محفوظة للرابط (get_source_cache)
+    لا يحفظ شيئاً - الحفظ في scrape_all بعد تخزين العروض
+    """
+    headers = {}
+    if cached:
+        if cached['etag']:
+            headers['If-None-Match'] = cached['etag']
+        if cached['last_modified']:
+            headers['If-Modified-Since'] = cached['last_modified']
+    
+    try:
+        async with session.get(url, headers=headers, allow_redirects=True) as response:
+            if response.status == 304:
+                CACHE_REQUESTS.inc(cache='source_page', result='hit')
+                logger.info(f"{url} not modified")
+                return None
+            if response.status != 200:
+                logger.warning(f"{url} returned {response.status}")
+                return None
+            
+            body = await response.read()
+            validators = (
+                response.headers.get('ETag'),
+                response.headers.get('Last-Modified'),
+                hashlib.sha256(body).hexdigest(),
+            )
+            # بعض المواقع لا ترسل ETag - نقارن بصمة المحتوى
+            if cached and cached['content_hash'] == validators[2]:
+                CACHE_REQUESTS.inc(cache='source_page', result='hit')
+                logger.info(f"{url} unchanged")
+                return None
+            if conditional:
+                CACHE_REQUESTS.inc(cache='source_page', result='miss')
+            return body.decode(response.get_encoding(), errors='replace'), validators
+    except aiohttp.ClientError as e:
+        logger.warning(f"Fetch failed {url}: {e}")
+    return None
+
+
+async def scrape_source(session: aiohttp.ClientSession, source: dict, conditional=True) -> tuple:
+    """سحب مصدر واحد - التحليل يتم في thread منفصل
+
+    يرجع (العروض، [(url, etag, last_modified, content_hash)...]) للصفحات التي حُللت
+    بيانات التخزين لا تُحفظ هنا: الصفحة تُعتبر "لم تتغير" فقط بعد تخزين عروضها
+    """
+    loop = asyncio.get_running_loop()
+    offers = []
+    validators = []
+    for url in source['urls']:
+        cached = await loop.run_in_executor(None, get_source_cache, url) if conditional else None
+        fetched = await fetch_page(session, url, conditional, cached)
+        if fetched is None:
+            continue
+        page, page_validators = fetched
+        offers.extend(await loop.run_in_executor(None, source['parse'], page, url, source))
+        validators.append((url, *page_validators))
+    return offers, validators
+
+
+def _save_validators(validators):
+    for row in validators:
+        save_source_cache(*row)
+
+
+async def scrape_all(sources: list, on_result=None, timeout=SCRAPE_SOURCE_TIMEOUT, conditional=True) -> list:
+    """سحب كل المصادر بالتوازي
+
+    on_result(source, offers) تُستدعى (await) لكل مصدر فور انتهائه - ترفع استثناء إذا فشل التخزين.
+    conditional=False يتجاهل حالة آخر سحب ويحلل كل الصفحات، ولا يحفظ حالة جديدة.
+    حالة الصفحات (ETag/Last-Modified/البصمة) تُحفظ فقط بعد نجاح on_result لكل المصدر،
+    فمصدر انتهت مهلته أو فشل تخزين عروضه يُسحب كاملاً في المرة القادمة.
+    يرجع قائمة (source, عدد العروض, الخطأ) بترتيب الانتهاء.
+    """
+    loop = asyncio.get_running_loop()
+    results = []
+    async with create_session() as session:
+
+        async def run(source):
+            try:
+                offers, validators = await asyncio.wait_for(scrape_source(session, source, conditional), timeout)
+                return source, offers, validators, None
+            except asyncio.TimeoutError:
+                return source, [], [], TimeoutError(f"timeout after {timeout}s")
+            except Exception as e:
+                return source, [], [], e
+
+        for finished in asyncio.as_completed([run(source) for source in sources]):
+            source, offers, validators, error = await finished
+            if not error and offers and on_result:
+                try:
+                    await on_result(source, offers)
+                except Exception as e:
+                    error = e
+            if error:
+                logger.warning(f"Source {source['name']} failed: {error}")
+            elif conditional and on_result and validators:
+                await loop.run_in_executor(None, _save_validators, validators)
+            results.append((source, len(offers), error))
+
+    return results
@@ -0,0 +1,131 @@
+"""
+مصادر العروض - المواقع و RSS من الإعدادات
+كل مصدر عبارة عن روابط + دالة تحليل تحوّل الصفحة إلى قائمة عروض
+"""
+
+import re
+import logging
+import xml.etree.ElementTree as ET
+from urllib.parse import urljoin
+
+from bs4 import BeautifulSoup
+
+from config import SITE_SOURCES
+
+logger = logging.getLogger(__name__)
+
+# نمط الخصم أو السعر داخل نص البطاقة
+PRICE_PATTERN = re.compile(r'(\d+\s*%|\d+(?:\.\d+)?\s*(?:ريال|ر\.س|SAR))')
+
+
+
+def _offer(title, link, source, category, price=None, image_url=None, description=None):
+    return {
+        'title': title,
+        'link': link,
+        'price': price,
+        'category': category,
+        'source': source,
+        'image_url': image_url,
+        'description': description,
+    }
+
+
+def parse_deal_cards(html: str, url: str, source: dict) -> list:
+    """تحليل صفحة عروض (بطاقات فيها عنوان ورابط وصورة) - البطاقات حسب source['selector']"""
+    soup = BeautifulSoup(html, 'html.parser')
+    offers = []
+    seen = set()
+
+    for card in soup.select(source['selector']):
+        anchor = card.find('a', href=True)
+        if not anchor:
+            continue
+        link = urljoin(url, anchor['href'])
+        if link in seen:
+            continue
+
+        heading = card.find(['h2', 'h3', 'h4']) or anchor
+        title = heading.get_text(" ", strip=True)
+        if not title:
+            continue
+
+        text = card.get_text(" ", strip=True)
+        price_match = PRICE_PATTERN.search(text)
+        img = card.find('img')
+        image_url = None
+        if img:
+            image_url = img.get('data-src') or img.get('src')
+            if image_url:
+                image_url = urljoin(url, image_url)
+
+        desc_tag = card.find('p')
+        description = desc_tag.get_text(" ", strip=True)[:200] if desc_tag else None
+
+        seen.add(link)
+        offers.append(_offer(
+            title[:150], link, source['label'], source.get('category'),
+            price_match.group(1) if price_match else None, image_url, description
+        ))
+
+    return offers
+
+
+def parse_rss(xml_text: str, url: str, source: dict) -> list:
+    """تحليل RSS Feed"""
+    offers = []
+    try:
+        root = ET.fromstring(xml_text)
+    except ET.ParseError as e:
+        logger.warning(f"Invalid RSS from {url}: {e}")
+        return offers
+
+    for item in root.iter('item'):
+        title = (item.findtext('title') or '').strip()
+        link = (item.findtext('link') or '').strip()
+        if not title or not link:
+            continue
+        description = item.findtext('description') or ''
+        description = BeautifulSoup(description, 'html.parser').get_text(" ", strip=True)[:200]
+        enclosure = item.find('enclosure')
+        image_url = enclosure.get('url') if enclosure is not None else None
+        price_match = PRICE_PATTERN.search(title)
+        offers.append(_offer(
+            title[:150], link, source['label'], source.get('category'),
+            price_match.group(1) if price_match else None, image_url, description or None
+        ))
+
+    return offers
+
+
+# ============== المصادر ==============
+# المواقع من config.SITE_SOURCES - لكل موقع محدد CSS لبطاقاته (لا محددات عامة مخمّنة)
+
+def site_source(site: dict) -> dict:
+    """تحويل إعداد موقع من config إلى مصدر"""
+    return {
+        "name": site['name'],
+        "label": site.get('label', site['name']),
+        "urls": list(site['urls']),
+        "category": site.get('category'),
+        "selector": site['selector'],
+        "parse": parse_deal_cards,
+    }
+
+
+def rss_source(feed: dict) -> dict:
+    """تحويل إعداد RSS من config إلى مصدر"""
+    return {
+        "name": f"rss:{feed['url']}",
+        "label": feed.get('name', feed['url']),
+        "urls": [feed['url']],
+        "category": feed.get('category'),
+        "parse": parse_rss,
+    }
+
+
+def build_sources(rss_feeds=None, site_sources=None) -> list:
+    """كل المصادر: المواقع (SITE_SOURCES) + RSS من الإعدادات"""
+    if site_sources is None:
+        site_sources = SITE_SOURCES
+    return [site_source(site) for site in site_sources] + [rss_source(feed) for feed in rss_feeds or []]
@@ -0,0 +1,97 @@
+"""
+مرسل الرسائل الصادرة - Outbound Sender
+طابور إرسال يحترم حدود تيليجرام (لكل محادثة وعامة) ويتعامل مع RetryAfter
+"""
+
+import asyncio
+import logging
+import time
+
+from telegram.error import RetryAfter
+
+from config import SEND_GLOBAL_PER_SECOND, SEND_CHAT_INTERVAL, SEND_MAX_RETRIES
+
+logger = logging.getLogger(__name__)
+
+
+def retry_after_seconds(error: RetryAfter) -> float:
+    """مدة الانتظار المطلوبة من تيليجرام بالثواني"""
+    delay = error.retry_after
+    # الإصدارات الحديثة من المكتبة ترجع timedelta
+    if hasattr(delay, 'total_seconds'):
+        delay = delay.total_seconds()
+    return float(delay)
+
+
+class OutboundSender:
+    """توزيع الرسائل الصادرة على فترات تحترم حدود تيليجرام"""
+
+    def __init__(self, global_per_second=SEND_GLOBAL_PER_SECOND,
+                 chat_interval=SEND_CHAT_INTERVAL, max_retries=SEND_MAX_RETRIES):
+        self.global_interval = 1.0 / global_per_second
+        self.chat_interval = chat_interval
+        self.max_retries = max_retries
+        self._lock = asyncio.Lock()
+        self._next_global = 0.0
+        self._next_chat = {}
+        self._paused_until = 0.0
+        # مجموع مدد الإيقاف - المواعيد المحجوزة قبل إيقاف تتأخر بقدر ما أضافه
+        self._pause_shift = 0.0
+
+    async def _wait_turn(self, chat_id):
+        """حجز موعد الإرسال التالي ثم الانتظار حتى يحين
+
+        RetryAfter أثناء الانتظار يؤخر الموعد المحجوز بمدة الإيقاف (بدون حجز جديد يستهلك السعة).
+        """
+        async with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._paused_until, self._next_global, self._next_chat.get(chat_id, 0.0))
+            self._next_global = slot + self.global_interval
+            self._next_chat[chat_id] = slot + self.chat_interval
+            shift = self._pause_shift
+        while True:
+            delay = slot - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if self._pause_shift == shift and time.monotonic() >= self._paused_until:
+                return
+            # إيقاف بدأ أو امتد أثناء الانتظار - نفس الترتيب والتباعد بعده
+            slot = max(slot + self._pause_shift - shift, self._paused_until)
+            shift = self._pause_shift
+
+    def _pause(self, delay):
+        """إيقاف كل الإرسال delay ثانية (الحد عام على البوت وليس هذه المحادثة فقط)"""
+        now = time.monotonic()
+        until = now + delay
+        if until <= self._paused_until:
+            return
+        added = until - max(now, self._paused_until)
+        self._pause_shift += added
+        self._paused_until = until
+        # الحجوزات الجديدة بعد المواعيد المؤجلة
+        if self._next_global > now:
+            self._next_global += added
+
+    async def send(self, chat_id, func, **kwargs):
+        """استدعاء دالة إرسال من البوت مع احترام الحدود وإعادة المحاولة عند RetryAfter"""
+        for attempt in range(self.max_retries + 1):
+            await self._wait_turn(chat_id)
+            try:
+                return await func(chat_id=chat_id, **kwargs)
+            except RetryAfter as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = retry_after_seconds(e)
+                logger.warning(f"Flood limit hit, pausing sends for {delay:.0f}s")
+                self._pause(delay)
+
+
+# مرسل مشترك (إنشاء كسول داخل حلقة الأحداث)
+_sender = None
+
+def get_sender() -> OutboundSender:
+    """الحصول على المرسل المشترك"""
+    global _sender
+    if _sender is None:
+        _sender = OutboundSender()
+    return _sender
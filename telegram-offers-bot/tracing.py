@@ -0,0 +1,211 @@
+"""
+تتبع الطلبات - Tracing
+spans خفيفة لكل مرحلة (handle_text ← download_video ← مزود التحميل ← رفع تيليجرام)
+تُكتب كل رحلة كاملة كسطر JSON (حقول بأسماء OTLP) في TRACE_FILE (اختياري - فارغ افتراضياً)
+الكتابة في thread منفصل عبر طابور (لا I/O على حلقة الأحداث) والملف يُدوَّر بحجم محدود
+
+تحليل الملف: python tracing.py [traces.jsonl]  ← أبطأ مرحلة لكل منصة
+"""
+
+import atexit
+import functools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import aiohttp
+
+from config import TRACE_FILE, TRACE_FILE_MAX_BYTES, TRACE_FILE_BACKUPS
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar('current_span', default=None)
+_exporter = None
+
+
+class Span:
+    __slots__ = ('name', 'trace_id', 'span_id', 'parent_id', 'start', 'end', 'attributes', 'trace')
+
+    def __init__(self, name, parent=None, trace_id=None, start=None, **attributes):
+        self.name = name
+        self.parent_id = parent.span_id if parent else None
+        self.trace_id = parent.trace_id if parent else (trace_id or os.urandom(16).hex())
+        self.span_id = os.urandom(8).hex()
+        self.start = start or time.time()
+        self.end = None
+        self.attributes = attributes
+        # كل spans الرحلة في قائمة واحدة - تُصدَّر عند انتهاء الجذر
+        self.trace = parent.trace if parent else []
+        self.trace.append(self)
+
+    def finish(self, end=None):
+        self.end = end or time.time()
+
+    def to_dict(self):
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id,
+            "name": self.name,
+            "startTimeUnixNano": int(self.start * 1e9),
+            "endTimeUnixNano": int((self.end or self.start) * 1e9),
+            "attributes": self.attributes,
+        }
+
+
+def current_span():
+    return _current.get()
+
+
+def set_attribute(key, value):
+    """إضافة صفة للـ span الحالي (مثل platform)"""
+    s = _current.get()
+    if s is not None:
+        s.attributes[key] = value
+
+
+def _get_exporter():
+    """logger خاص بالرحلات: QueueHandler ← thread يكتب في RotatingFileHandler"""
+    global _exporter
+    if _exporter is None:
+        try:
+            handler = logging.handlers.RotatingFileHandler(
+                TRACE_FILE, maxBytes=TRACE_FILE_MAX_BYTES, backupCount=TRACE_FILE_BACKUPS, encoding='utf-8')
+        except OSError as e:
+            logger.warning(f"Trace export disabled: {e}")
+            _exporter = False
+            return _exporter
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        records = queue.SimpleQueue()
+        listener = logging.handlers.QueueListener(records, handler)
+        listener.start()
+        # ما تبقى في الطابور يُكتب عند الخروج
+        atexit.register(listener.stop)
+        _exporter = logging.getLogger('tracing.export')
+        _exporter.propagate = False
+        _exporter.setLevel(logging.INFO)
+        _exporter.addHandler(logging.handlers.QueueHandler(records))
+    return _exporter
+
+
+def _export(trace):
+    if not TRACE_FILE:
+        return
+    exporter = _get_exporter()
+    if exporter:
+        exporter.info(json.dumps([s.to_dict() for s in trace], ensure_ascii=False))
+
+
+@contextmanager
+def span(name, trace_id=None, **attributes):
+    """مرحلة واحدة - الجذر (بدون أب) يصدّر الرحلة كاملة عند انتهائه
+
+    trace_id: متابعة رحلة بدأت في عملية أخرى (مثلاً البوت ← worker.py)
+    """
+    parent = _current.get()
+    s = Span(name, parent, trace_id, **attributes)
+    token = _current.set(s)
+    try:
+        yield s
+    except Exception as e:
+        s.attributes['error'] = repr(e)
+        raise
+    finally:
+        s.finish()
+        _current.reset(token)
+        if parent is None:
+            _export(s.trace)
+
+
+def record_span(name, start, end, **attributes):
+    """span بأوقات معروفة مسبقاً (مثل الانتظار في الطابور) تحت الـ span الحالي"""
+    parent = _current.get()
+    if parent is None:
+        return
+    Span(name, parent, start=start, **attributes).finish(end)
+
+
+def traced(name=None):
+    """decorator: span باسم الدالة حول دالة async"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with span(name or func.__name__):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# ===== طلبات HTTP (aiohttp) =====
+# كل طلب داخل رحلة يصبح span: من بدء الطلب حتى آخر جزء مستلم من الجسم
+
+async def _on_request_start(session, ctx, params):
+    parent = _current.get()
+    ctx.span = Span(f"http {params.method}", parent, host=params.url.host) if parent else None
+
+
+async def _on_request_end(session, ctx, params):
+    if ctx.span:
+        ctx.span.attributes['status'] = params.response.status
+        ctx.span.finish()
+
+
+async def _on_chunk(session, ctx, params):
+    if ctx.span:
+        ctx.span.attributes['bytes'] = ctx.span.attributes.get('bytes', 0) + len(params.chunk)
+        ctx.span.finish()
+
+
+async def _on_request_exception(session, ctx, params):
+    if ctx.span:
+        ctx.span.attributes['error'] = repr(params.exception)
+        ctx.span.finish()
+
+
+def http_trace_config() -> aiohttp.TraceConfig:
+    """trace_configs=[http_trace_config()] لجلسات aiohttp"""
+    config = aiohttp.TraceConfig()
+    config.on_request_start.append(_on_request_start)
+    config.on_request_end.append(_on_request_end)
+    config.on_response_chunk_received.append(_on_chunk)
+    config.on_request_exception.append(_on_request_exception)
+    return config
+
+
+# ===== التحليل =====
+
+def summarize(path):
+    """المدة حسب (المنصة، المرحلة) - الأبطأ أولاً حسب p95"""
+    with open(path, encoding='utf-8') as f:
+        spans = [s for line in f for s in json.loads(line)]
+    # الرحلة قد تُكتب على أكثر من سطر (البوت ثم worker.py) - المنصة حسب traceId
+    platforms = {s['traceId']: s['attributes']['platform'] for s in spans if 'platform' in s['attributes']}
+
+    durations = {}
+    for s in spans:
+        platform = platforms.get(s['traceId'], '-')
+        name = s['name'] + (f" {s['attributes']['host']}" if 'host' in s['attributes'] else "")
+        ms = (s['endTimeUnixNano'] - s['startTimeUnixNano']) / 1e6
+        durations.setdefault((platform, name), []).append(ms)
+
+    rows = []
+    for (platform, name), values in durations.items():
+        values.sort()
+        p50 = values[len(values) // 2]
+        p95 = values[min(len(values) - 1, int(len(values) * 0.95))]
+        rows.append((platform, name, len(values), p50, p95, values[-1]))
+    rows.sort(key=lambda r: (r[0], -r[4]))
+
+    print(f"{'platform':<12}{'stage':<40}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+    for platform, name, n, p50, p95, worst in rows:
+        print(f"{platform:<12}{name[:39]:<40}{n:>6}{p50:>10.0f}{p95:>10.0f}{worst:>10.0f}")
+
+
+if __name__ == "__main__":
+    summarize(sys.argv[1] if len(sys.argv) > 1 else TRACE_FILE)
@@ -0,0 +1,48 @@
+"""
+معالجة التحديثات بالتوازي مع الحفاظ على ترتيب كل محادثة
+صورة بطيئة من مستخدم لا تؤخر رسائل باقي المستخدمين، وردود نفس المحادثة لا تتداخل
+"""
+
+import asyncio
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """حد أقصى للتحديثات المتزامنة + قفل لكل محادثة"""
+
+    def __init__(self, max_concurrent_updates: int, max_pending_updates: int = None):
+        # حد الأساس يحدد عدد التحديثات المنتظرة + الجارية، وحد العمال يحدد الجارية فقط.
+        # القفل يؤخذ قبل مكان العامل حتى لا تحجز محادثة مزدحمة كل العمال وهي تنتظر دورها.
+        super().__init__(max_pending_updates or max_concurrent_updates * 16)
+        self._workers = asyncio.Semaphore(max_concurrent_updates)
+        # chat_id -> [Lock, عدد التحديثات المنتظرة أو الجارية]
+        self._chat_locks = {}
+
+    async def do_process_update(self, update, coroutine):
+        chat = update.effective_chat if isinstance(update, Update) else None
+        if chat is None:
+            async with self._workers:
+                await coroutine
+            return
+
+        entry = self._chat_locks.get(chat.id)
+        if entry is None:
+            entry = self._chat_locks[chat.id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                async with self._workers:
+                    await coroutine
+        finally:
+            entry[1] -= 1
+            # لا نحتفظ بأقفال المحادثات الخاملة (الذاكرة ثابتة مهما زاد المستخدمون)
+            if entry[1] == 0:
+                del self._chat_locks[chat.id]
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
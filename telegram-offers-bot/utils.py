@@ -5,6 +5,8 @@ from PIL import Image, ImageDraw, ImageFont
 import arabic_reshaper
 from bidi.algorithm import get_display
 
+from metrics import timed, RENDER_SECONDS
+
 # قائمة روابط خطوط بديلة
 FONT_URLS = [
     "https://github.com/googlefonts/noto-fonts/raw/main/hinted/ttf/NotoSansArabic/NotoSansArabic-Bold.ttf",
@@ -69,6 +71,7 @@ def process_arabic(text):
         return text
 
 
+@timed(RENDER_SECONDS)
 def create_offer_image(image_url, title, price, store_name, category=""):
     """تصميم صورة العرض - يرجع None إذا فشل"""
     
@@ -0,0 +1,127 @@
+"""
+وضع Webhook - خادم aiohttp بدل long polling
+POST /telegram  ← تحديثات تيليجرام (أو JSON تجريبي للاختبار المحلي)
+GET  /health    ← فحص الحالة (متاح أيضاً في وضع polling)
+GET  /metrics   ← مقاييس الأداء بصيغة Prometheus
+"""
+
+import asyncio
+import json
+import logging
+import secrets
+import signal
+
+from aiohttp import web
+from telegram import Update
+from telegram.ext import Application
+
+import metrics
+from database import get_media_queue_depth
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_PATH = "/telegram"
+
+
+async def metrics_endpoint(request: web.Request) -> web.Response:
+    # بعض المقاييس تُحسب عند القراءة باستعلام SQLite (عمق طابور الوسائط) - خارج حلقة الأحداث
+    # (qsize لطابور التحديثات مجرد قراءة طول، آمنة من thread آخر)
+    text = await asyncio.get_running_loop().run_in_executor(None, metrics.render)
+    return web.Response(text=text, content_type="text/plain", charset="utf-8")
+
+
+def create_web_app(application: Application, secret_token=None, webhook=True) -> web.Application:
+    """تطبيق aiohttp يمرر التحديثات لطابور البوت (webhook=False: فحص الحالة فقط)"""
+    if webhook and not secret_token:
+        raise ValueError("webhook endpoint requires a secret token")
+
+    async def telegram_webhook(request: web.Request) -> web.Response:
+        if not secrets.compare_digest(request.headers.get('X-Telegram-Bot-Api-Secret-Token', ''), secret_token):
+            return web.Response(status=403)
+        try:
+            data = await request.json()
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            return web.Response(status=400, text="invalid JSON")
+        try:
+            update = Update.de_json(data, application.bot)
+        except (TypeError, KeyError, AttributeError):
+            # JSON صالح لكن ليس تحديثاً ({"foo": 1} أو [1]) - خطأ من المرسل وليس 500
+            update = None
+        if update is None:
+            return web.Response(status=400, text="invalid update")
+        # الرد فوراً - المعالجة تتم في الخلفية حتى لا يعيد تيليجرام الإرسال
+        await application.update_queue.put(update)
+        return web.Response()
+
+    async def health(request: web.Request) -> web.Response:
+        return web.json_response({
+            "status": "ok" if application.running else "starting",
+            "pending_updates": application.update_queue.qsize(),
+        })
+
+    metrics.QUEUE_DEPTH.set_function(application.update_queue.qsize, queue='updates')
+    metrics.QUEUE_DEPTH.set_function(get_media_queue_depth, queue='media_jobs')
+
+    web_app = web.Application()
+    if webhook:
+        web_app.router.add_post(WEBHOOK_PATH, telegram_webhook)
+    web_app.router.add_get('/health', health)
+    web_app.router.add_get('/metrics', metrics_endpoint)
+    return web_app
+
+
+def health_server_hooks(host: str, port: int):
+    """post_init/post_shutdown لخادم /health في وضع polling (عملية web يجب أن تستمع على PORT)"""
+    runner = None
+
+    async def post_init(application: Application):
+        nonlocal runner
+        runner = web.AppRunner(create_web_app(application, webhook=False))
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        logger.info(f"Health server listening on {host}:{port}")
+
+    async def post_shutdown(application: Application):
+        if runner:
+            await runner.cleanup()
+
+    return post_init, post_shutdown
+
+
+async def run_webhook(application: Application, host: str, port: int, webhook_url=None, secret_token=None):
+    """تشغيل البوت بخادم webhook حتى الإيقاف (Ctrl+C أو SIGTERM)
+
+    الرابط عام - بدون WEBHOOK_SECRET يُولَّد سر عشوائي لهذا التشغيل ويُسجَّل مع الـ webhook،
+    فلا يُقبل أي تحديث لا يحمله (انتحال المشرفين بتحديثات مزيفة).
+    """
+    if not secret_token:
+        secret_token = secrets.token_urlsafe(32)
+        logger.info("WEBHOOK_SECRET not set - using a random secret for this run")
+    runner = web.AppRunner(create_web_app(application, secret_token))
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            # Windows
+            pass
+
+    async with application:
+        # بدون رابط عام لا نسجل webhook - مفيد للاختبار المحلي بـ curl
+        if webhook_url:
+            await application.bot.set_webhook(
+                url=webhook_url.rstrip('/') + WEBHOOK_PATH,
+                secret_token=secret_token,
+                allowed_updates=Update.ALL_TYPES,
+            )
+            logger.info(f"Webhook set to {webhook_url.rstrip('/')}{WEBHOOK_PATH}")
+        await application.start()
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        logger.info(f"Webhook server listening on {host}:{port}")
+        try:
+            await stop.wait()
+        finally:
+            await runner.cleanup()
+            await application.stop()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+عامل الوسائط - Media Worker
+يسحب مهام التحميل والصور من الطابور المشترك (SQLite) وينفذها ويرد عبر Bot API
+يمكن تشغيل أكثر من عامل بنفس ملف القاعدة: python worker.py
+"""
+
+import asyncio
+import logging
+import os
+import signal
+import socket
+
+from aiohttp import web
+from telegram import Bot
+
+from config import (
+    BOT_TOKEN, WORKER_CONCURRENCY, WORKER_POLL_INTERVAL, JOB_STALE_TIMEOUT, JOB_MAX_ATTEMPTS, WORKER_METRICS_PORT
+)
+from database import init_db, claim_media_job, finish_media_job, requeue_stale_media_jobs
+from handlers.media_jobs import run_job
+from webhook import metrics_endpoint
+
+logging.basicConfig(format='%(asctime)s - %(levelname)s - %(message)s', level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+async def worker_slot(bot: Bot, worker_id: str, stop: asyncio.Event):
+    """مكان تنفيذ واحد: حجز مهمة ← تنفيذها ← تسجيل النتيجة"""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        job = await loop.run_in_executor(None, claim_media_job, worker_id)
+        if job is None:
+            try:
+                await asyncio.wait_for(stop.wait(), WORKER_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            continue
+
+        logger.info(f"Job {job['id']} ({job['kind']}) started, attempt {job['attempts']}")
+        try:
+            success = await run_job(bot, job)
+        except Exception as e:
+            logger.error(f"Job {job['id']} crashed: {e}")
+            success = False
+        await loop.run_in_executor(None, finish_media_job, job['id'], success)
+        logger.info(f"Job {job['id']} {'done' if success else 'failed'}")
+
+
+async def requeue_loop(stop: asyncio.Event):
+    """إعادة مهام العمال المتوقفين للطابور"""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        requeued = await loop.run_in_executor(None, requeue_stale_media_jobs, JOB_STALE_TIMEOUT, JOB_MAX_ATTEMPTS)
+        if requeued:
+            logger.warning(f"Requeued {requeued} stale jobs")
+        try:
+            await asyncio.wait_for(stop.wait(), JOB_STALE_TIMEOUT / 2)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def run_worker():
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            pass
+
+    runner = None
+    if WORKER_METRICS_PORT:
+        web_app = web.Application()
+        web_app.router.add_get('/metrics', metrics_endpoint)
+        runner = web.AppRunner(web_app)
+        await runner.setup()
+        await web.TCPSite(runner, "0.0.0.0", WORKER_METRICS_PORT).start()
+
+    try:
+        async with Bot(BOT_TOKEN) as bot:
+            logger.info(f"Worker {worker_id} started with {WORKER_CONCURRENCY} slots")
+            # المهمة الجارية تكتمل قبل الإيقاف
+            await asyncio.gather(
+                requeue_loop(stop),
+                *(worker_slot(bot, worker_id, stop) for _ in range(WORKER_CONCURRENCY)),
+            )
+    finally:
+        if runner:
+            await runner.cleanup()
+
+
+def main():
+    print("🛠️ Media worker starting...")
+    init_db()
+    asyncio.run(run_worker())
+
+
+if __name__ == "__main__":
+    main()